@@ -0,0 +1,140 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# Measures the memory kept alive by the nodes of the AST of a big module,
+# and by the nodes of the Lua AST generated from it, in bytes per node. The
+# nodes alone are also copied with the `__slots__` of their classes and with
+# the `__dict__` they had before, to compare both layouts.
+
+import os, sys, gc, time, tempfile, tracemalloc
+
+BSC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bsc"
+)
+sys.path.append(os.path.dirname(BSC_DIR))
+
+from bsc import Context, utils
+from bsc.astgen import ast
+from bsc.codegen import lua_ast
+
+SIZE = 4000
+
+def module_source(size):
+    src = utils.Builder()
+    for i in range(size):
+        src.writeln(f"const c{i}: int = {i};")
+    for i in range(size):
+        src.writeln(f"fn f{i}(a{i}: int) {{")
+        src.writeln(f"    const l: int = (c{i} + a{i}) * 2 - {i} / 3;")
+        src.writeln(f"    var v = if a{i} > 0 {{ l }} else {{ c{i} }};")
+        src.writeln(f"    f{i}(v);")
+        src.writeln("}")
+    src.writeln("fn main() {}")
+    return str(src)
+
+def node_objects(root, module):
+    # the distinct objects of the classes defined in `module` that are
+    # reachable from `root`
+    seen = set()
+    nodes = []
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif type(obj).__module__ == module.__name__ and id(obj) not in seen:
+            if isinstance(obj, (ast.AssignOp, ast.UnaryOp, ast.BinaryOp)):
+                continue
+            seen.add(id(obj))
+            nodes.append(obj)
+            if hasattr(obj, "__dict__"):
+                stack.extend(vars(obj).values())
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    stack.append(getattr(obj, slot, None))
+    return nodes
+
+def fields(obj):
+    values = {}
+    for cls in reversed(type(obj).__mro__):
+        for slot in getattr(cls, "__slots__", ()):
+            if hasattr(obj, slot):
+                values[slot] = getattr(obj, slot)
+    values.update(getattr(obj, "__dict__", {}))
+    return values
+
+def copy_nodes(nodes, with_slots):
+    # the copies share the fields of the nodes, so only the nodes themselves
+    # are allocated; without slots, each class is replaced by a plain one
+    # whose instances keep their fields in a `__dict__`
+    dict_classes = {}
+    copies = []
+    for node in nodes:
+        cls = type(node)
+        if with_slots:
+            copy = object.__new__(cls)
+        else:
+            if cls not in dict_classes:
+                dict_classes[cls] = type(cls.__name__, (), {})
+            copy = dict_classes[cls]()
+        for name, value in fields(node).items():
+            setattr(copy, name, value)
+        copies.append(copy)
+    return copies
+
+def copy_size(nodes, with_slots):
+    gc.collect()
+    tracemalloc.start()
+    copies = copy_nodes(nodes, with_slots)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+def measure(name, module, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    root = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = node_objects(root, module)
+    count = len(nodes)
+    print(
+        f"  {utils.bold(name)}: {count} nodes, {size / 1024 / 1024:.1f} MiB, {size / count:.1f} bytes per node ({elapsed * 1000:.0f} ms)"
+    )
+    slots_size = copy_size(nodes, True)
+    dict_size = copy_size(nodes, False)
+    print(
+        f"    the nodes alone: {dict_size / count:.1f} bytes per node with a `__dict__` (before), {slots_size / count:.1f} with `__slots__` (after)"
+    )
+    return root
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    bs_file = os.path.join(tmp_dir, "nodes.bs")
+    with open(bs_file, "w") as f:
+        f.write(module_source(SIZE))
+    ctx = Context(echo_diagnostics = False)
+    ctx.parse_args(["--no-cache", bs_file])
+    warm_file = os.path.join(tmp_dir, "warm.bs")
+    with open(warm_file, "w") as f:
+        f.write("fn main() {}")
+    ctx.astgen.parse_file("warm", warm_file) # loads the parser
+
+    print(utils.bold(f"Memory of the ASTs of a module with {SIZE} functions"))
+    sf = measure(
+        "bsc.astgen.ast", ast,
+        lambda: ctx.astgen.parse_file(ctx.prefs.pkg_name, bs_file, True)
+    )
+    ctx.add_source_file(sf, None)
+    ctx.sema.check_files(ctx.source_files)
+    if ctx.report.errors > 0:
+        utils.error(f"the benchmark code has errors:\n{ctx.report}")
+
+    def gen_file():
+        ctx.codegen.gen_file(sf)
+        return ctx.codegen.modules.pop()
+
+    measure("bsc.codegen.lua_ast", lua_ast, gen_file)
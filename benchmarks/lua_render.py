@@ -0,0 +1,110 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# Measures the throughput of `LuaRender` on synthetic Lua ASTs, in MB of
+# generated code per second, the time it takes to render them again when
+# the output files are already up to date, and the peak memory it allocates
+# while rendering a big module.
+
+import os, sys, time, shutil, tempfile, tracemalloc
+
+BSC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bsc"
+)
+sys.path.append(os.path.dirname(BSC_DIR))
+
+from bsc import Context, utils
+from bsc.codegen.lua_ast import *
+from bsc.codegen.lua_render import LuaRender
+from bsc.utils import BSC_OUT_DIR
+
+RUNS = 5
+MODULES = 20
+FUNCTIONS = 500
+
+def lua_function(i):
+    fn = LuaFunction([LuaIdent("a"), LuaIdent("b")])
+    fn.block.add_comment(f"function number {i}")
+    fn.block.add_stmt(
+        LuaAssignment([LuaIdent("x")], [
+            LuaBinaryExpr(
+                LuaBinaryExpr(LuaIdent("a"), "+", LuaNumberLit(str(i))), "*",
+                LuaParenExpr(LuaUnaryExpr("-", LuaIdent("b")))
+            )
+        ])
+    )
+    loop = LuaWhile(LuaBinaryExpr(LuaIdent("x"), ">", LuaNumberLit("0")))
+    loop.stmts.append(
+        LuaAssignment([LuaIdent("x")],
+                      [LuaBinaryExpr(LuaIdent("x"), "-", LuaNumberLit("1"))],
+                      False)
+    )
+    loop.stmts.append(
+        LuaCallExpr(
+            "print",
+            [LuaStringLit(f"f{i}"),
+             LuaIdent("x"),
+             LuaBooleanLit(True)]
+        )
+    )
+    fn.block.add_stmt(loop)
+    fn.block.add_stmt(
+        LuaReturn(
+            LuaTable([
+                LuaTableField(LuaIdent("x"), LuaIdent("x")),
+                LuaTableField(LuaStringLit("y"), LuaNil())
+            ])
+        )
+    )
+    return LuaAssignment([LuaIdent(f"f{i}")], [fn])
+
+def lua_module(name, functions):
+    module = LuaModule(name)
+    for i in range(functions):
+        module.block.add_stmt(lua_function(i))
+    return module
+
+def render(ctx, modules):
+    LuaRender(ctx, modules).render_modules()
+    return sum(
+        os.path.getsize(os.path.join(BSC_OUT_DIR, f"{module.name}.lua"))
+        for module in modules
+    )
+
+ctx = Context()
+utils.full_version() # only computed once per process
+modules = [lua_module(f"m{i}", FUNCTIONS) for i in range(MODULES)]
+big_module = [lua_module("big", FUNCTIONS * MODULES)]
+with tempfile.TemporaryDirectory() as tmp_dir:
+    os.chdir(tmp_dir)
+    times, unchanged_times = [], []
+    for _ in range(RUNS):
+        shutil.rmtree(BSC_OUT_DIR, ignore_errors = True)
+        start = time.perf_counter()
+        size = render(ctx, modules)
+        times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        render(ctx, modules) # every file is skipped
+        unchanged_times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    big_size = render(ctx, big_module)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.chdir(os.path.dirname(BSC_DIR))
+
+print(
+    utils.bold(
+        f"LuaRender on {MODULES} modules of {FUNCTIONS} functions ({RUNS} runs)"
+    )
+)
+best = min(times)
+print(
+    f"  {utils.bold('throughput')}: {size / 1e6:.1f} MB in {best * 1000:.0f} ms, {size / 1e6 / best:.1f} MB/s"
+)
+print(
+    f"  {utils.bold('unchanged outputs')}: {min(unchanged_times) * 1000:.0f} ms"
+)
+print(
+    f"  {utils.bold('peak memory')}: {peak / 1024:.0f} KiB to render a module of {big_size / 1e6:.1f} MB"
+)
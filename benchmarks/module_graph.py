@@ -0,0 +1,59 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# Measures how long `utils.DepGraph` takes to order the modules of packages
+# with thousands of modules and to look for import cycles in them, like
+# `Context.resolve_deps` does. Each module imports the previous one and a
+# few others declared before it, so the graph has no cycles, unless the
+# first module also imports the last one.
+
+import os, sys, time, random
+
+BSC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bsc"
+)
+sys.path.append(os.path.dirname(BSC_DIR))
+
+from bsc import utils
+
+SIZES = (500, 1000, 2000, 4000)
+DEPS_PER_MODULE = 4
+
+def module_graph(size, with_cycle = False):
+    rand = random.Random(size)
+    g = utils.DepGraph()
+    for i in range(size):
+        deps = []
+        if i == 0 and with_cycle:
+            deps.append(f"pkg::m{size - 1}")
+        elif i > 0:
+            deps.append(f"pkg::m{i - 1}")
+            for _ in range(DEPS_PER_MODULE - 1):
+                deps.append(f"pkg::m{rand.randrange(i)}")
+        g.add(f"pkg::m{i}", deps)
+    return g
+
+def timed(fn):
+    start = time.perf_counter()
+    res = fn()
+    return res, time.perf_counter() - start
+
+print(
+    utils.bold(
+        f"DepGraph on packages with N modules and {DEPS_PER_MODULE} imports per module"
+    )
+)
+for size in SIZES:
+    g = module_graph(size)
+    g_resolved, resolve_time = timed(g.resolve)
+    cycles, cycles_time = timed(g_resolved.display_cycles)
+    if not g_resolved.acyclic or len(g_resolved.nodes) != size or cycles:
+        utils.error("the benchmark graph was not resolved")
+    g_cycle = module_graph(size, with_cycle = True).resolve()
+    cycle, cycle_time = timed(g_cycle.display_cycles)
+    if g_cycle.acyclic or not cycle:
+        utils.error("the cycle of the benchmark graph was not found")
+    print(
+        f"  {utils.bold(f'N = {size}')}: resolve {resolve_time * 1000:.1f} ms, display_cycles {cycles_time * 1000:.1f} ms, display_cycles with a cycle {cycle_time * 1000:.1f} ms"
+    )
@@ -0,0 +1,60 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# Measures the time it takes a fresh interpreter to import `bsc.astgen` and
+# get a ready-to-use LALR parser, with and without the serialized parser
+# cached on disk.
+
+import os, sys, glob
+
+BSC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bsc"
+)
+sys.path.append(os.path.dirname(BSC_DIR))
+
+from bsc import utils
+from bsc.astgen import PARSER_CACHE_DIR
+
+RUNS = 5
+
+STARTUP_CODE = f"""
+import sys, time
+sys.path.append({os.path.dirname(BSC_DIR)!r})
+start = time.perf_counter()
+import bsc.astgen
+bsc.astgen.get_parser()
+print(time.perf_counter() - start)
+"""
+
+def clear_cache():
+    for cache_file in glob.glob(os.path.join(PARSER_CACHE_DIR, "grammar-*")):
+        os.remove(cache_file)
+
+def startup_time():
+    res = utils.execute(sys.executable, "-c", STARTUP_CODE)
+    if res.exit_code != 0:
+        utils.error(f"the startup code failed:\n{res.err}")
+    return float(res.out)
+
+def report(name, times):
+    avg = sum(times) / len(times)
+    print(
+        f"  {utils.bold(name)}: avg {avg * 1000:.1f} ms, min {min(times) * 1000:.1f} ms, max {max(times) * 1000:.1f} ms"
+    )
+    return avg
+
+cold = []
+for _ in range(RUNS):
+    clear_cache()
+    cold.append(startup_time())
+
+warm = []
+startup_time() # make sure the cache exists
+for _ in range(RUNS):
+    warm.append(startup_time())
+
+print(f"{utils.bold('import bsc.astgen + get_parser()')} ({RUNS} runs each)")
+cold_avg = report("cold (no parser cache)", cold)
+warm_avg = report("warm (parser cache)", warm)
+print(f"{utils.bold('Speedup:')} {cold_avg / warm_avg:.2f}x")
@@ -0,0 +1,53 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# Measures how long Sema takes to register and resolve the symbols of
+# modules with thousands of declarations. With a linear `Scope.find` the
+# time per declaration grows with the size of the module, with the name
+# index it should stay flat.
+
+import os, sys, time, tempfile
+
+BSC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bsc"
+)
+sys.path.append(os.path.dirname(BSC_DIR))
+
+from bsc import Context, utils
+
+SIZES = (1000, 2000, 4000, 8000)
+
+def module_source(size):
+    src = utils.Builder()
+    for i in range(size):
+        src.writeln(f"const c{i}: int = {i};")
+    for i in range(size):
+        src.writeln(f"fn f{i}(a{i}: int) {{ const l: int = c{i}; }}")
+    src.writeln("fn main() {}")
+    return str(src)
+
+def sema_time(bs_file):
+    ctx = Context(echo_diagnostics = False)
+    ctx.parse_args(["--check", "--no-cache", bs_file])
+    ctx.parse_input()
+    ctx.import_modules()
+    start = time.perf_counter()
+    ctx.sema.check_files(ctx.source_files)
+    elapsed = time.perf_counter() - start
+    if ctx.report.errors > 0:
+        utils.error(f"the benchmark code has errors:\n{ctx.report}")
+    return elapsed
+
+print(
+    utils.bold("Sema.check_files on a module with N constants and N functions")
+)
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for size in SIZES:
+        bs_file = os.path.join(tmp_dir, f"decls{size}.bs")
+        with open(bs_file, "w") as f:
+            f.write(module_source(size))
+        elapsed = sema_time(bs_file)
+        print(
+            f"  {utils.bold(f'N = {size}')}: {elapsed * 1000:.1f} ms, {elapsed / (size * 2) * 1e6:.2f} us per declaration"
+        )
@@ -2,95 +2,225 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
-import os
+import os, glob, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-from bsc import report, utils
+from bsc import utils, astgen
 from bsc.astgen import AstGen
-from bsc.astgen.ast import BasicType, ModDecl
+from bsc.astgen.ast import TypeTable, ModDecl
 from bsc.prefs import Prefs
+from bsc.report import Report
 from bsc.sema import Sema
 from bsc.codegen import Codegen
+from bsc.manifest import Manifest
+from bsc.modules import ModuleIndex
 from bsc.sym import Scope, TypeSym, AccessModifier, TypeKind
 
+WATCH_INTERVAL = 0.25 # seconds
+
+# What `Context.compile` returns: the diagnostics that were reported and the
+# exit code for the command line.
+class Result:
+    def __init__(self, report):
+        self.diagnostics = report.diagnostics
+        self.errors = report.errors
+        self.warnings = report.warnings
+        self.exit_code = 1 if report.errors > 0 else 0
+
+    def succeeded(self):
+        return self.exit_code == 0
+
 class Context:
-    def __init__(self):
+    # with `echo_diagnostics` disabled the diagnostics are only available in
+    # the result of `compile`
+    def __init__(self, echo_diagnostics = True):
         self.prefs = Prefs()
+        self.echo_diagnostics = echo_diagnostics
+        # the parsers and the caches of these are kept between compilations
+        self.astgen = AstGen(self)
+        self.manifest = Manifest(self)
+        self.reset()
+
+    def reset(self):
+        # discards the state of the previous compilation
+        self.report = Report(self.echo_diagnostics)
 
         self.universe = Scope(is_universe = True)
+        self.types = TypeTable()
 
         self.universe.add_sym(
             TypeSym(AccessModifier.private, TypeKind.void, "void", [], Scope())
         )
-        self.void_type = BasicType.with_typesym(self.universe.syms[0])
+        self.void_type = self.types.basic(self.universe.syms[0])
 
         self.universe.add_sym(
             TypeSym(
                 AccessModifier.private, TypeKind.never, "never", [], Scope()
             )
         )
-        self.never_type = BasicType.with_typesym(self.universe.syms[1])
+        self.never_type = self.types.basic(self.universe.syms[1])
 
         self.universe.add_sym(
             TypeSym(AccessModifier.private, TypeKind.nil, "nil", [], Scope())
         )
-        self.nil_type = BasicType.with_typesym(self.universe.syms[2])
+        self.nil_type = self.types.basic(self.universe.syms[2])
 
         self.universe.add_sym(
             TypeSym(AccessModifier.private, TypeKind.any, "any", [], Scope())
         )
-        self.any_type = BasicType.with_typesym(self.universe.syms[3])
+        self.any_type = self.types.basic(self.universe.syms[3])
 
         self.universe.add_sym(
             TypeSym(AccessModifier.private, TypeKind.bool, "bool", [], Scope())
         )
-        self.bool_type = BasicType.with_typesym(self.universe.syms[4])
+        self.bool_type = self.types.basic(self.universe.syms[4])
 
         self.universe.add_sym(
             TypeSym(AccessModifier.private, TypeKind.int, "int", [], Scope())
         )
-        self.int_type = BasicType.with_typesym(self.universe.syms[5])
+        self.int_type = self.types.basic(self.universe.syms[5])
 
         self.universe.add_sym(
             TypeSym(
                 AccessModifier.private, TypeKind.float, "float", [], Scope()
             )
         )
-        self.float_type = BasicType.with_typesym(self.universe.syms[6])
+        self.float_type = self.types.basic(self.universe.syms[6])
 
         self.universe.add_sym(
             TypeSym(
                 AccessModifier.private, TypeKind.string, "string", [], Scope()
             )
         )
-        self.string_type = BasicType.with_typesym(self.universe.syms[7])
+        self.string_type = self.types.basic(self.universe.syms[7])
 
         self.source_files = []
+        self.modules = ModuleIndex()
+
+        self.parse_pool = None
+        self.pending_parses = deque()
 
-        self.astgen = AstGen(self)
         self.sema = Sema(self)
         self.codegen = Codegen(self)
 
-    def parse_args(self):
-        self.prefs.parse_args()
+    def parse_args(self, argv = None):
+        self.prefs.parse_args(argv)
+
+    def recompile(self, argv):
+        # compiles with the arguments `argv` from a clean state, keeping only
+        # the parsers and caches of the previous compilations; used by the
+        # daemon and the test runners, which cannot keep watching the input
+        self.reset()
+        self.prefs = Prefs()
+        self.parse_args(argv)
+        if self.prefs.is_watch:
+            utils.error("`--watch` can only be used from the command line")
+        return self.compile()
+
+    def watch(self):
+        # the compiler is kept loaded and the package is compiled again each
+        # time one of its files changes
+        print(utils.bold(f"watching `{self.prefs.input}` for changes..."))
+        watched_files = None
+        try:
+            while True:
+                files = self.watched_files()
+                if files != watched_files:
+                    watched_files = files
+                    self.reset()
+                    start = time.perf_counter()
+                    if self.compile().succeeded():
+                        status = utils.green("build succeeded")
+                    else:
+                        status = utils.red("build failed")
+                    elapsed = (time.perf_counter() - start) * 1000
+                    print(
+                        f"{utils.bold(status)} in {elapsed:.1f} ms, waiting for changes..."
+                    )
+                time.sleep(WATCH_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+
+    def watched_files(self):
+        # every module of the package lives in the directory of the input
+        files = {}
+        input_dir = os.path.dirname(self.prefs.input)
+        for file in glob.glob(
+            os.path.join(input_dir, "**", "*.bs"), recursive = True
+        ):
+            try:
+                files[file] = os.stat(file).st_mtime_ns
+            except OSError:
+                pass # removed while scanning, the next scan will notice it
+        return files
 
     def compile(self):
+        self.run_passes()
+        return Result(self.report)
+
+    def run_passes(self):
+        # each pass only runs if the previous ones did not report errors
         self.parse_input()
-        if report.errors > 0:
-            exit(1)
+        if self.report.errors > 0:
+            return
         self.import_modules()
-        if report.errors > 0:
-            exit(1)
-        self.sema.check_files(self.source_files)
-        if report.errors > 0:
-            exit(1)
+        if self.report.errors > 0:
+            return
+        changed_files = None
         if not self.prefs.is_check:
-            self.codegen.gen_files(self.source_files)
+            # the manifest is computed and saved by every build, so it always
+            # describes the generated files, even after `--no-incremental`
+            changed_files = self.manifest.changed_files(self.source_files)
+            if self.prefs.is_incremental:
+                self.vlog(
+                    f"{len(changed_files)} of {len(self.source_files)} modules changed since the last build"
+                )
+                if self.prefs.is_bundle and len(changed_files) > 0:
+                    # the bundle always contains every module, so they are
+                    # all checked and generated again
+                    changed_files = self.source_files
+            else:
+                changed_files = None
+        self.sema.check_files(self.source_files, changed_files)
+        if self.report.errors > 0:
+            return
+        if not self.prefs.is_check:
+            if changed_files == None:
+                self.codegen.gen_files(self.source_files)
+            else:
+                self.codegen.gen_files(changed_files)
+            self.manifest.save()
 
     def import_modules(self):
-        for sf in self.source_files:
-            self.import_modules_from_decls(sf.mod_sym, sf.decls)
+        if self.prefs.jobs > 1:
+            self.import_modules_in_parallel()
+        else:
+            for sf in self.source_files:
+                self.import_modules_from_decls(sf.mod_sym, sf.decls)
         self.resolve_deps()
 
+    def import_modules_in_parallel(self):
+        # the submodules are parsed by the workers as soon as their parent
+        # is imported, but the results are consumed in the same order as the
+        # serial import, so the source files and diagnostics keep their order
+        with ProcessPoolExecutor(
+            self.prefs.jobs, initializer = astgen.init_worker,
+            initargs = (self.prefs, )
+        ) as pool:
+            self.parse_pool = pool
+            for sf in self.source_files:
+                self.import_modules_from_decls(sf.mod_sym, sf.decls)
+            while len(self.pending_parses) > 0:
+                pending = self.pending_parses.popleft()
+                mod_name, file, parent_mod, future = pending
+                sf = self.astgen.load_worker_result(
+                    mod_name, file, False, future.result()
+                )
+                if self.add_source_file(sf, parent_mod):
+                    self.import_modules_from_decls(sf.mod_sym, sf.decls)
+        self.parse_pool = None
+
     def import_modules_from_decls(self, parent, decls):
         for decl in decls:
             if isinstance(decl, ModDecl):
@@ -109,11 +239,12 @@ class Context:
             if os.path.isfile(mod_bs):
                 self.parse_file(decl.name, file, parent_mod = parent)
             else:
-                report.error(
-                    f"cannot load module `{decl.name}`, because it does not contain a file `mod.bs`"
+                self.report.error(
+                    f"cannot load module `{decl.name}`, because it does not contain a file `mod.bs`",
+                    decl.pos
                 )
         else:
-            report.error(f"module `{decl.name}` not found", decl.pos)
+            self.report.error(f"module `{decl.name}` not found", decl.pos)
 
     def resolve_deps(self):
         g = self.module_graph()
@@ -124,39 +255,57 @@ class Context:
         self.vlog("-----------------------------------------")
         cycles = g_resolved.display_cycles()
         if len(cycles) > 1:
-            utils.error(
+            self.report.error(
                 f"import cycle detected between the following modules:\n{cycles}"
             )
+            return
         self.vlog("----------= imported modules =-----------")
         for node in g_resolved.nodes:
             self.vlog(f"> {node.name}")
         self.vlog("-----------------------------------------")
-        source_files = self.source_files
-        self.source_files = []
-        for node in g_resolved.nodes:
-            for sf in source_files:
-                if sf.mod_sym.qualname() == node.name:
-                    self.source_files.append(sf)
+        self.source_files = self.modules.ordered([
+            node.name for node in g_resolved.nodes
+        ])
         self.vlog("module dependencies resolved...")
 
     def module_graph(self):
         g = utils.DepGraph()
-        for sf in self.source_files:
-            deps = []
-            for dep in sf.deps:
-                dep.parent = sf.mod_sym
-                deps.append(dep.qualname())
-            g.add(sf.mod_sym.qualname(), deps)
+        for name, deps in self.modules.deps.items():
+            g.add(name, deps)
         return g
 
     def parse_input(self):
         self.parse_file(self.prefs.pkg_name, self.prefs.input, is_pkg = True)
 
     def parse_file(self, mod_name, file, is_pkg = False, parent_mod = None):
-        self.source_files.append(
-            self.astgen.parse_file(mod_name, file, is_pkg, parent_mod)
+        if self.parse_pool:
+            self.pending_parses.append((
+                mod_name, file, parent_mod,
+                self.parse_pool.submit(
+                    astgen.parse_file_in_worker, mod_name, file, is_pkg
+                )
+            ))
+            return
+        self.add_source_file(
+            self.astgen.parse_file(mod_name, file, is_pkg), parent_mod
         )
 
+    def add_source_file(self, sf, parent_mod = None):
+        if sf.mod_sym == None:
+            return False # the file has syntax errors
+        try:
+            if sf.mod_sym.is_pkg:
+                self.universe.add_sym(sf.mod_sym)
+            else:
+                assert parent_mod, f"parent_mod is None for `{sf.mod_sym.name}`"
+                parent_mod.scope.add_sym(sf.mod_sym)
+        except utils.CompilerError as e:
+            self.report.error(e.args[0])
+            return False
+        self.source_files.append(sf)
+        self.modules.add(sf)
+        return True
+
     def vlog(self, s):
         if self.prefs.is_verbose:
             bsc_log = utils.bold(utils.green("[bsc-log]"))
@@ -2,13 +2,38 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
-import os, sys
+import os, sys, importlib.util
 
 BSC_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(BSC_DIR))
 
-from bsc import Context
+def load_daemon_module():
+    # loaded by path, the client must start without importing the compiler
+    spec = importlib.util.spec_from_file_location(
+        "bsc_daemon", os.path.join(BSC_DIR, "daemon.py")
+    )
+    daemon = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(daemon)
+    return daemon
 
-ctx = Context()
-ctx.parse_args()
-ctx.compile()
+# the guard keeps the worker processes of `-j` from compiling again when
+# they import this module
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) > 0 and args[0] in ("daemon", "client"):
+        daemon = load_daemon_module()
+        if args[0] == "daemon":
+            exit(daemon.run_daemon(args[1:]))
+        exit_code = daemon.run_client(args[1:])
+        if exit_code != None:
+            exit(exit_code)
+        args = args[1:] # the daemon is not running, compile here
+
+    from bsc import Context
+
+    ctx = Context()
+    ctx.parse_args(args)
+    if ctx.prefs.is_watch:
+        ctx.watch()
+    else:
+        exit(ctx.compile().exit_code)
@@ -2,15 +2,96 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
-from lark import Lark, v_args, Transformer, Token, visitors, exceptions
+import os, glob, hashlib
+from io import StringIO
+from contextlib import redirect_stdout
+
+from lark import Lark, v_args, Transformer, Token, exceptions
 
 from bsc.astgen.ast import *
-from bsc import utils, report
+from bsc.astgen.cache import AstCache, dumps_ast, loads_ast
+from bsc import utils
+from bsc.report import Report
 from bsc.sym import AccessModifier, Module, Scope
 
-bs_parser = Lark.open(
-    "grammar.lark", rel_to = __file__, parser = 'earley', start = "module"
-)
+GRAMMAR_FILE = os.path.join(os.path.dirname(__file__), "grammar.lark")
+PARSER_CACHE_DIR = os.path.join(os.path.dirname(__file__), "__pycache__")
+
+grammar_hash_ = ""
+
+def grammar_hash():
+    global grammar_hash_
+    if grammar_hash_ == "":
+        with open(GRAMMAR_FILE, "rb") as f:
+            grammar_hash_ = hashlib.sha256(f.read()).hexdigest()
+    return grammar_hash_
+
+def parser_cache_file():
+    # the LALR tables are serialized next to the bytecode, in a file named
+    # after the grammar hash, so they are only rebuilt when the grammar changes
+    cache_file = os.path.join(
+        PARSER_CACHE_DIR, f"grammar-{grammar_hash()[:16]}.lalr"
+    )
+    try:
+        if not os.path.exists(cache_file):
+            os.makedirs(PARSER_CACHE_DIR, exist_ok = True)
+            for old_cache_file in glob.glob(
+                os.path.join(PARSER_CACHE_DIR, "grammar-*.lalr")
+            ):
+                os.remove(old_cache_file)
+    except OSError:
+        return False # read-only installation, build the parser every time
+    return cache_file
+
+def open_parser(algorithm = "lalr", transformer = None):
+    # Lark only supports caching LALR parsers; the transformer is not part
+    # of the cached data, so the inline parser shares the same cache file
+    return Lark.open(
+        GRAMMAR_FILE, parser = algorithm, start = "module",
+        transformer = transformer,
+        cache = parser_cache_file() if algorithm == "lalr" else False
+    )
+
+# the parsers are only built the first time they are requested, so choosing
+# one of them doesn't pay for the construction of the other
+bs_parsers = {}
+
+def get_parser(algorithm = "lalr"):
+    if algorithm not in bs_parsers:
+        bs_parsers[algorithm] = open_parser(algorithm)
+    return bs_parsers[algorithm]
+
+# Each worker process of `-j` has its own context, the parsed declarations
+# are sent back pickled with references to the objects owned by the context,
+# and the diagnostics are captured so they can be reported in order.
+worker_ctx = None
+
+def init_worker(prefs):
+    global worker_ctx
+    from bsc import Context
+    worker_ctx = Context()
+    worker_ctx.prefs = prefs
+
+def parse_file_in_worker(mod_name, file, is_pkg):
+    out = StringIO()
+    worker_ctx.report = Report(echo = False)
+    with redirect_stdout(out):
+        source_file = worker_ctx.astgen.parse_file(mod_name, file, is_pkg)
+    data = None
+    if source_file.mod_sym:
+        data = dumps_ast(
+            worker_ctx, source_file.mod_sym, file, source_file.decls,
+            source_file.deps
+        )
+    return (
+        data, source_file.src_hash, out.getvalue(),
+        worker_ctx.report.diagnostics
+    )
+
+def expected_terminals(e):
+    # `e.expected` is a set with LALR, so it is sorted to report the same
+    # message on every run
+    return ", ".join(sorted(e.expected))
 
 @v_args(inline = True)
 class AstGen(Transformer):
@@ -18,52 +99,109 @@ class AstGen(Transformer):
         super().__init__()
         self.ctx = ctx
         self.file = ""
-        self.source_file = None
+        self.file_id = -1
         self.source_file_deps = []
         self.mod_sym = None
+        self.inline_parser = None
+        self.ast_cache = AstCache(ctx)
 
-    def parse_file(self, mod_name, file, is_pkg = False, parent_mod = None):
+    def parse_file(self, mod_name, file, is_pkg = False):
+        mod_sym = self.new_module(mod_name, is_pkg)
+        # the per-file state is only used by the callbacks while this file
+        # is parsed; the module is registered in its parent by the context
         self.file = file
-        self.mod_sym = Module(
+        self.file_id = source_map.update(file)
+        self.mod_sym = mod_sym
+        self.source_file_deps = []
+        src = open(file).read()
+        cache_key = None
+        cached = None
+        if self.ctx.prefs.use_ast_cache:
+            cache_key = self.ast_cache.key(file, src)
+            cached = self.ast_cache.load(file, cache_key, mod_sym)
+        if cached:
+            self.ctx.vlog(f"`{file}` loaded from the AST cache")
+            decls, deps = cached
+            source_file = SourceFile(file, decls, mod_sym, deps = deps)
+        else:
+            errors = self.ctx.report.errors
+            source_file = self.parse_source(file, src)
+            # files with diagnostics are parsed again, to report them again
+            if source_file.mod_sym and cache_key and (
+                self.ctx.report.errors == errors
+            ):
+                self.ast_cache.store(
+                    file, cache_key, mod_sym, source_file.decls,
+                    source_file.deps
+                )
+        source_file.src_hash = hashlib.sha256(src.encode()).hexdigest()
+        self.file = ""
+        self.file_id = -1
+        self.mod_sym = None
+        self.source_file_deps = []
+        return source_file
+
+    def new_module(self, mod_name, is_pkg):
+        return Module(
             AccessModifier.public, mod_name, Scope(self.ctx.universe, True),
             is_pkg
         )
+
+    def load_worker_result(self, mod_name, file, is_pkg, result):
+        data, src_hash, out, diagnostics = result
+        source_map.update(file)
+        print(out, end = "")
+        self.ctx.report.extend(diagnostics)
+        if data == None:
+            return SourceFile("", [], None)
+        mod_sym = self.new_module(mod_name, is_pkg)
+        decls, deps = loads_ast(self.ctx, mod_sym, file, data)
+        source_file = SourceFile(file, decls, mod_sym, deps = deps)
+        source_file.src_hash = src_hash
+        return source_file
+
+    def parse_source(self, file, src):
         try:
-            self.source_file = SourceFile(
-                self.file, self.transform(bs_parser.parse(open(file).read())),
-                self.mod_sym, deps = self.source_file_deps
+            return SourceFile(
+                self.file, self.parse(src), self.mod_sym,
+                deps = self.source_file_deps
             )
         except exceptions.UnexpectedCharacters as e:
-            report.error(
+            self.ctx.report.error(
                 f"unexpected character `{e.char}`",
-                Pos(file, e.line, e.column, 1, e.pos_in_stream)
+                Pos(self.file_id, e.pos_in_stream, 1)
             )
             return SourceFile("", [], None)
         except exceptions.UnexpectedToken as e:
-            report.error(
-                f"expected {e.expected}, got {e.token}, ",
-                Pos(file, e.line, e.column, 1, e.pos_in_stream)
-            )
+            if e.token.type == "$END": # LALR reports EOF as a token
+                self.ctx.report.error(
+                    f"unexpected end of file, expected {expected_terminals(e)}",
+                    Pos(self.file_id, e.pos_in_stream, 1)
+                )
+            else:
+                self.ctx.report.error(
+                    f"expected {expected_terminals(e)}, got `{e.token}`",
+                    Pos(self.file_id, e.pos_in_stream, 1)
+                )
             return SourceFile("", [], None)
         except exceptions.UnexpectedEOF as e:
-            report.error(
-                f"unexpected end of file, expected {e.expected}",
-                Pos(file, e.line, e.column, 1, e.pos_in_stream)
+            self.ctx.report.error(
+                f"unexpected end of file, expected {expected_terminals(e)}",
+                Pos(self.file_id, e.pos_in_stream, 1)
             )
             return SourceFile("", [], None)
-        try:
-            if is_pkg:
-                self.ctx.universe.add_sym(self.source_file.mod_sym)
-            else:
-                assert parent_mod, f"parent_mod is None for `{mod_name}`"
-                parent_mod.scope.add_sym(self.source_file.mod_sym)
-        except utils.CompilerError as e:
-            utils.error(e.args[0])
-        self.source_file_deps = []
-        return self.source_file
+
+    def parse(self, src):
+        # with LALR, the AST nodes are built directly from the parser
+        # reductions, without building the full parse tree first
+        if self.ctx.prefs.parser == "lalr" and not self.ctx.prefs.use_parse_tree:
+            if self.inline_parser == None:
+                self.inline_parser = open_parser("lalr", self)
+            return self.inline_parser.parse(src)
+        return self.transform(get_parser(self.ctx.prefs.parser).parse(src))
 
     def mkpos(self, token):
-        return Pos.from_token(self.file, token)
+        return Pos.from_token(self.file_id, token)
 
     # Declarations
     def module(self, *nodes):
@@ -567,7 +705,7 @@ class AstGen(Transformer):
         inner_type = nodes[1]
         pos = self.mkpos(nodes[0])
         if isinstance(inner_type, OptionType):
-            report.error(
+            self.ctx.report.error(
                 "cannot declare an option type using another option type", pos
             )
         return OptionType(inner_type, pos)
@@ -586,15 +724,6 @@ class AstGen(Transformer):
         types = list(filter(lambda node: not isinstance(node, Token), nodes))
         return SumType(types, nodes[0].pos)
 
-    # Discard `;`
-    def SEMICOLON(self, *nodes):
-        return visitors.Discard
-
-    # This really shouldn't be necessary... but due to a bug, we have to return
-    # the only node that has `stmt`
-    def stmt(self, *nodes):
-        return nodes[0]
-
     # Utilities
     def get_access_modifier(self, node):
         _access_modifier = AccessModifier.private
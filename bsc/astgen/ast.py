@@ -3,39 +3,114 @@
 # LICENSE file.
 
 from typing import Any
+from bisect import bisect_right
 from enum import IntEnum, auto
 
+from bsc.sym import TypeKind
+
+# The nodes are declared with `__slots__`, the AST of a big package has
+# millions of them. The fields filled in later by Sema (`typ`, `sym`,
+# `scope`...) also need a slot, and are set to `None` by the constructors.
+
+# The files the positions refer to, by their index in `paths`. The line and
+# column of a position are only needed to print a diagnostic, so they are
+# computed then, from the offsets where each line of the file starts (the
+# file is read again for that).
+class SourceMap:
+    def __init__(self):
+        self.paths = []
+        self.ids = {}
+        self.line_starts = {}
+
+    def file_id(self, path):
+        if (file_id := self.ids.get(path)) == None:
+            file_id = len(self.paths)
+            self.paths.append(path)
+            self.ids[path] = file_id
+        return file_id
+
+    def update(self, path):
+        # the file may have changed since its positions were last resolved
+        file_id = self.file_id(path)
+        self.line_starts.pop(file_id, None)
+        return file_id
+
+    def line_column(self, file_id, offset):
+        if offset < 0: # the end of the file, as reported by Lark
+            return -1, -1
+        if (line_starts := self.line_starts.get(file_id)) == None:
+            with open(self.paths[file_id]) as f:
+                src = f.read()
+            line_starts = [0]
+            i = src.find("\n")
+            while i != -1:
+                line_starts.append(i + 1)
+                i = src.find("\n", i + 1)
+            self.line_starts[file_id] = line_starts
+        line = bisect_right(line_starts, offset)
+        return line, offset - line_starts[line - 1] + 1
+
+source_map = SourceMap()
+
+# A span of `len` characters of a source file, from offset `start`. The
+# diagnostics point to offset `at`: the start of the span, or of the last
+# span it was joined with (`a + b` points to `b`). Most of them are created
+# from tokens and share their offset, so they do not allocate new integers.
 class Pos:
-    def __init__(self, file, line, column, len, pos):
-        self.file = file
-        self.line = line
-        self.column = column
+    __slots__ = ("file_id", "start", "len", "at")
+
+    def __init__(self, file_id, start, len, at = None):
+        self.file_id = file_id
+        self.start = start
         self.len = len
-        self.pos = pos
+        self.at = start if at == None else at
+
+    @staticmethod
+    def from_token(file_id, token):
+        return Pos(file_id, token.start_pos, len(token))
 
     @staticmethod
-    def from_token(file, token):
-        return Pos(file, token.line, token.column, len(token), token.start_pos)
+    def with_file(file, start, len, at):
+        return Pos(source_map.file_id(file), start, len, at)
+
+    @property
+    def file(self):
+        return source_map.paths[self.file_id]
+
+    def line_column(self):
+        return source_map.line_column(self.file_id, self.at)
 
     def __add__(self, other):
         return Pos(
-            self.file, other.line, other.column,
-            other.pos - self.pos + other.len, self.pos
+            self.file_id, self.start, other.start + other.len - self.start,
+            other.at
         )
 
+    def __reduce__(self):
+        # the file ids are only valid in the process that created them, so
+        # the positions are pickled (to the AST cache or from a worker) with
+        # the path of their file
+        return (Pos.with_file, (self.file, self.start, self.len, self.at))
+
     def __str__(self):
-        return f"Pos(file='{self.file}', line={self.line}, column={self.column}, len={self.len}, pos={self.pos})"
+        line, column = self.line_column()
+        return f"Pos(file='{self.file}', line={line}, column={column}, len={self.len}, start={self.start})"
 
 class SourceFile:
+    __slots__ = ("file", "mod_sym", "decls", "deps", "src_hash")
+
     def __init__(self, file, decls, mod_sym, deps = []):
         self.file = file
         self.mod_sym = mod_sym
         self.decls = decls
         self.deps = deps
+        self.src_hash = ""
 
 # Declarations
 
 class ExternPkg:
+    __slots__ = ("pkg_name", "alias_name", "pos", "sym")
+
     def __init__(self, pkg_name, alias_name, pos):
         self.pkg_name = pkg_name
         self.alias_name = alias_name
@@ -43,6 +118,8 @@ class ExternPkg:
         self.sym = None
 
 class ModDecl:
+    __slots__ = ("access_modifier", "name", "is_inline", "decls", "pos", "sym")
+
     def __init__(
         self, access_modifier, name, is_inline, decls, pos, sym = None
     ):
@@ -54,6 +131,8 @@ class ModDecl:
         self.sym = sym
 
 class EnumDecl:
+    __slots__ = ("access_modifier", "name", "fields", "decls", "pos", "sym")
+
     def __init__(self, access_modifier, name, fields, decls, pos):
         self.access_modifier = access_modifier
         self.name = name
@@ -63,11 +142,18 @@ class EnumDecl:
         self.sym = None
 
 class EnumField:
+    __slots__ = ("name", "value")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
 
 class FnDecl:
+    __slots__ = (
+        "access_modifier", "name", "args", "is_method", "ret_type", "stmts",
+        "has_body", "is_main", "sym", "pos"
+    )
+
     def __init__(
         self, access_modifier, name, args, is_method, ret_type, stmts, is_main,
         pos
@@ -85,6 +171,8 @@ class FnDecl:
         self.pos = pos
 
 class FnArg:
+    __slots__ = ("name", "type", "default_value", "pos")
+
     def __init__(self, name, type, default_value, pos):
         self.name = name
         self.type = type
@@ -92,6 +180,10 @@ class FnArg:
         self.pos = pos
 
 class ConstDecl:
+    __slots__ = (
+        "access_modifier", "name", "typ", "expr", "pos", "sym", "is_local"
+    )
+
     def __init__(self, access_modifier, name, typ, expr, pos):
         self.access_modifier = access_modifier
         self.name = name
@@ -102,6 +194,8 @@ class ConstDecl:
         self.is_local = False
 
 class VarDecl:
+    __slots__ = ("access_modifier", "lefts", "right", "pos")
+
     def __init__(self, access_modifier, lefts, right, pos):
         self.access_modifier = access_modifier
         self.lefts = lefts
@@ -109,6 +203,8 @@ class VarDecl:
         self.pos = pos
 
 class VarIdent:
+    __slots__ = ("name", "typ", "pos", "sym")
+
     def __init__(self, name, typ, pos):
         self.name = name
         self.typ = typ
@@ -118,9 +214,11 @@ class VarIdent:
 # Statements
 
 class Stmt:
-    pass
+    __slots__ = ()
 
 class ExprStmt(Stmt):
+    __slots__ = ("expr", "pos")
+
     def __init__(self, expr):
         assert isinstance(expr, Expr)
         self.expr = expr
@@ -166,6 +264,8 @@ class AssignOp(IntEnum):
         assert False # unreachable
 
 class WhileStmt(Stmt):
+    __slots__ = ("cond", "stmts", "pos")
+
     def __init__(self, cond, stmts, pos):
         self.cond = cond
         self.stmts = stmts
@@ -181,9 +281,11 @@ class WhileStmt(Stmt):
 # Expressions
 
 class Expr:
-    pass
+    __slots__ = ()
 
 class ParExpr(Expr):
+    __slots__ = ("expr", "pos", "typ")
+
     def __init__(self, expr, pos):
         self.expr = expr
         self.pos = pos
@@ -196,6 +298,8 @@ class ParExpr(Expr):
         return str(self)
 
 class BuiltinVar(Expr):
+    __slots__ = ("name", "pos", "typ")
+
     def __init__(self, name, pos):
         self.name = name
         self.pos = pos
@@ -208,6 +312,8 @@ class BuiltinVar(Expr):
         return str(self)
 
 class NilLiteral(Expr):
+    __slots__ = ("pos", "typ")
+
     def __init__(self, pos):
         self.pos = pos
         self.typ = None
@@ -219,6 +325,8 @@ class NilLiteral(Expr):
         return str(self)
 
 class BoolLiteral(Expr):
+    __slots__ = ("value", "pos", "typ")
+
     def __init__(self, value, pos):
         self.value = value
         self.pos = pos
@@ -231,6 +339,8 @@ class BoolLiteral(Expr):
         return str(self)
 
 class NumberLiteral(Expr):
+    __slots__ = ("value", "pos", "typ")
+
     def __init__(self, value, pos):
         self.value = value
         self.pos = pos
@@ -243,6 +353,8 @@ class NumberLiteral(Expr):
         return str(self)
 
 class StringLiteral(Expr):
+    __slots__ = ("value", "pos", "typ")
+
     def __init__(self, value, pos):
         self.value = value
         self.pos = pos
@@ -255,6 +367,8 @@ class StringLiteral(Expr):
         return str(self)
 
 class SelfLiteral(Expr):
+    __slots__ = ("pos", "typ")
+
     def __init__(self, pos):
         self.pos = pos
         self.typ = None
@@ -266,6 +380,8 @@ class SelfLiteral(Expr):
         return str(self)
 
 class ArrayLiteral(Expr):
+    __slots__ = ("elems", "is_fixed", "pos", "typ")
+
     def __init__(self, elems, is_fixed, pos):
         self.elems = elems
         self.is_fixed = is_fixed
@@ -280,6 +396,8 @@ class ArrayLiteral(Expr):
         return str(self)
 
 class TupleLiteral(Expr):
+    __slots__ = ("elems", "pos", "typ")
+
     def __init__(self, elems, pos):
         self.elems = elems
         self.pos = pos
@@ -292,6 +410,8 @@ class TupleLiteral(Expr):
         return str(self)
 
 class EnumLiteral(Expr):
+    __slots__ = ("name", "pos", "typ")
+
     def __init__(self, name, pos):
         self.name = name
         self.pos = pos
@@ -304,6 +424,8 @@ class EnumLiteral(Expr):
         return str(self)
 
 class Ident(Expr):
+    __slots__ = ("name", "pos", "scope", "sym", "typ")
+
     def __init__(self, name, pos):
         self.name = name
         self.pos = pos
@@ -318,6 +440,8 @@ class Ident(Expr):
         return str(self)
 
 class PathExpr(Expr):
+    __slots__ = ("left", "name", "pos", "left_sym", "sym", "typ")
+
     def __init__(self, left, name, pos):
         self.left = left
         self.name = name
@@ -333,6 +457,8 @@ class PathExpr(Expr):
         return str(self)
 
 class SelectorExpr(Expr):
+    __slots__ = ("left", "name", "pos", "sym", "typ")
+
     def __init__(self, left, name, pos):
         self.left = left
         self.name = name
@@ -347,6 +473,8 @@ class SelectorExpr(Expr):
         return str(self)
 
 class CallExpr(Expr):
+    __slots__ = ("left", "args", "pos", "typ")
+
     def __init__(self, left, args, pos):
         self.left = left
         self.args = args
@@ -469,6 +597,8 @@ class BinaryOp(IntEnum):
         return str(self)
 
 class UnaryExpr(Expr):
+    __slots__ = ("op", "right", "pos", "typ")
+
     def __init__(self, op, right, pos):
         self.op = op
         self.right = right
@@ -482,6 +612,8 @@ class UnaryExpr(Expr):
         return str(self)
 
 class BinaryExpr(Expr):
+    __slots__ = ("left", "op", "right", "pos", "typ")
+
     def __init__(self, left, op, right, pos):
         self.left = left
         self.op = op
@@ -496,6 +628,8 @@ class BinaryExpr(Expr):
         return str(self)
 
 class IfExpr(Expr):
+    __slots__ = ("branches", "pos", "typ")
+
     def __init__(self, branches, pos):
         self.branches = branches
         self.pos = pos
@@ -516,6 +650,8 @@ class IfExpr(Expr):
         return str(self)
 
 class IfBranch:
+    __slots__ = ("cond", "is_else", "expr", "pos", "typ")
+
     def __init__(self, cond, is_else, expr, pos):
         self.cond = cond
         self.is_else = is_else
@@ -524,6 +660,8 @@ class IfBranch:
         self.typ = None
 
 class MatchExpr(Expr):
+    __slots__ = ("expr", "branches", "pos", "typ")
+
     def __init__(self, expr, branches, pos):
         self.expr = expr
         self.branches = branches
@@ -549,6 +687,8 @@ class MatchExpr(Expr):
         return str(self)
 
 class MatchBranch:
+    __slots__ = ("cases", "is_else", "stmt", "pos", "typ")
+
     def __init__(self, cases, is_else, stmt, pos):
         self.cases = cases
         self.is_else = is_else
@@ -557,6 +697,8 @@ class MatchBranch:
         self.typ = None
 
 class BlockExpr(Expr):
+    __slots__ = ("is_unsafe", "stmts", "expr", "pos", "scope", "typ")
+
     def __init__(self, is_unsafe, stmts, expr, pos):
         self.is_unsafe = is_unsafe
         self.stmts = stmts
@@ -572,6 +714,8 @@ class BlockExpr(Expr):
         return res
 
 class ReturnExpr(Expr):
+    __slots__ = ("expr", "pos", "typ")
+
     def __init__(self, expr, pos):
         self.expr = expr
         self.pos = pos
@@ -586,6 +730,8 @@ class ReturnExpr(Expr):
         return str(self)
 
 class AssignExpr(Expr):
+    __slots__ = ("lefts", "op", "right", "pos", "typ")
+
     def __init__(self, lefts, op, right, pos):
         self.lefts = lefts
         self.op = op
@@ -597,8 +743,30 @@ class AssignExpr(Expr):
         return f"{', '.join([str(left) for left in self.lefts])} {self.op} {str(self.right)}"
 
 # Types
-class BasicType:
+
+class Type:
+    # The types written in the source are compared structurally, the ones
+    # created by `TypeTable` exist only once, so two of them are only equal
+    # if they are the same object.
+    __slots__ = ("is_interned", "is_numeric", "is_nilable")
+
+    def __init__(self):
+        self.is_interned = False
+        self.is_numeric = False
+        self.is_nilable = False
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if self.is_interned and isinstance(other, Type) and other.is_interned:
+            return False
+        return self.equals(other)
+
+class BasicType(Type):
+    __slots__ = ("expr", "typesym", "pos")
+
     def __init__(self, expr, pos):
+        super().__init__()
         self.expr = expr
         self.typesym = None
         self.pos = pos
@@ -617,15 +785,18 @@ class BasicType:
     def __repr__(self):
         return str(self)
 
-    def __eq__(self, other):
+    def equals(self, other):
         if isinstance(other, BasicType):
             if self.typesym:
                 return self.typesym == other.typesym
             return str(self.expr) == str(other.expr)
         return False
 
-class ResultType:
+class ResultType(Type):
+    __slots__ = ("type", "pos")
+
     def __init__(self, type, pos):
+        super().__init__()
         self.type = type
         self.pos = pos
 
@@ -635,13 +806,16 @@ class ResultType:
     def __repr__(self):
         return str(self)
 
-    def __eq__(self, other):
+    def equals(self, other):
         if isinstance(other, ResultType):
             return self.type == other.type
         return False
 
-class OptionType:
+class OptionType(Type):
+    __slots__ = ("type", "pos")
+
     def __init__(self, type, pos):
+        super().__init__()
         self.type = type
         self.pos = pos
 
@@ -651,13 +825,16 @@ class OptionType:
     def __repr__(self):
         return str(self)
 
-    def __eq__(self, other):
+    def equals(self, other):
         if isinstance(other, OptionType):
             return self.type == other.type
         return False
 
-class ArrayType:
+class ArrayType(Type):
+    __slots__ = ("size", "type", "pos")
+
     def __init__(self, size, type, pos):
+        super().__init__()
         self.size = size
         self.type = type
         self.pos = pos
@@ -670,13 +847,16 @@ class ArrayType:
     def __repr__(self):
         return str(self)
 
-    def __eq__(self, other):
+    def equals(self, other):
         if isinstance(other, ArrayType):
             return str(self.size) == str(other.size) and self.type == other.type
         return False
 
-class TableType:
+class TableType(Type):
+    __slots__ = ("k_type", "v_type", "pos")
+
     def __init__(self, k_type, v_type, pos):
+        super().__init__()
         self.k_type = k_type
         self.v_type = v_type
         self.pos = pos
@@ -687,13 +867,16 @@ class TableType:
     def __repr__(self):
         return str(self)
 
-    def __eq__(self, other):
+    def equals(self, other):
         if isinstance(other, TableType):
             return self.k_type == other.k_type and self.v_type == other.v_type
         return False
 
-class SumType:
+class SumType(Type):
+    __slots__ = ("types", "pos")
+
     def __init__(self, types, pos):
+        super().__init__()
         self.types = types
         self.pos = pos
 
@@ -703,7 +886,7 @@ class SumType:
     def __repr__(self):
         return str(self)
 
-    def __eq__(self, other):
+    def equals(self, other):
         if isinstance(other, SumType):
             if len(self.types) != len(other.types):
                 return False
@@ -713,8 +896,11 @@ class SumType:
             return True
         return False
 
-class TupleType:
+class TupleType(Type):
+    __slots__ = ("types", "pos")
+
     def __init__(self, types, pos):
+        super().__init__()
         self.types = types
         self.pos = pos
 
@@ -724,7 +910,7 @@ class TupleType:
     def __repr__(self):
         return str(self)
 
-    def __eq__(self, other):
+    def equals(self, other):
         if isinstance(other, TupleType):
             if len(self.types) != len(other.types):
                 return False
@@ -733,3 +919,56 @@ class TupleType:
                     return False
             return True
         return False
+
+# Hash-conses the types used by Sema: each distinct type is created once, so
+# they can be compared by identity and the facts about them are computed
+# when they are created. Each context has its own table, because the basic
+# types are keyed by their type symbols.
+class TypeTable:
+    def __init__(self):
+        self.types = {}
+
+    def intern(self, key, typ):
+        if interned := self.types.get(key):
+            return interned
+        typ.is_interned = True
+        self.types[key] = typ
+        return typ
+
+    def basic(self, typesym):
+        if typ := self.types.get(id(typesym)):
+            return typ
+        typ = BasicType.with_typesym(typesym)
+        typ.is_numeric = typesym.kind in (TypeKind.int, TypeKind.float)
+        typ.is_nilable = typesym.kind in (TypeKind.nil, TypeKind.any)
+        return self.intern(id(typesym), typ)
+
+    def result(self, inner):
+        return self.intern(("!", id(inner)), ResultType(inner, None))
+
+    def option(self, inner):
+        if typ := self.types.get(("?", id(inner))):
+            return typ
+        typ = OptionType(inner, None)
+        typ.is_nilable = True
+        return self.intern(("?", id(inner)), typ)
+
+    def array(self, size, inner):
+        return self.intern(("[]", str(size), id(inner)),
+                           ArrayType(size, inner, None))
+
+    def table(self, k_type, v_type):
+        return self.intern(("{}", id(k_type), id(v_type)),
+                           TableType(k_type, v_type, None))
+
+    def sum(self, types):
+        key = ("|", ) + tuple(id(t) for t in types)
+        if typ := self.types.get(key):
+            return typ
+        typ = SumType(types, None)
+        typ.is_nilable = any(t.is_nilable for t in types)
+        return self.intern(key, typ)
+
+    def tuple(self, types):
+        return self.intern(("()", ) + tuple(id(t) for t in types),
+                           TupleType(types, None))
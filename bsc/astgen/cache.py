@@ -0,0 +1,137 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import io, os, pickle, hashlib
+
+from bsc import utils
+from bsc.utils import BSC_OUT_DIR
+from bsc.astgen.ast import Pos, source_map
+
+AST_CACHE_DIR = os.path.join(BSC_OUT_DIR, ".cache")
+
+BUILTIN_TYPES = (
+    "void", "never", "nil", "any", "bool", "int", "float", "string"
+)
+
+sources_hash_ = ""
+
+def sources_hash():
+    # the pickled AST depends on the classes in `ast.py` and `sym.py` and on
+    # what the AstGen callbacks build, not only on the grammar
+    global sources_hash_
+    if sources_hash_ == "":
+        h = hashlib.sha256()
+        astgen_dir = os.path.dirname(__file__)
+        for source in (
+            "ast.py", "__init__.py", "grammar.lark",
+            os.path.join("..", "sym.py")
+        ):
+            with open(os.path.join(astgen_dir, source), "rb") as f:
+                h.update(f.read())
+        sources_hash_ = h.hexdigest()
+    return sources_hash_
+
+def shared_objects(ctx, mod_sym):
+    # objects owned by the context (or created for the module being parsed)
+    # are referenced by name instead of being copied along with the AST
+    shared = {
+        "universe": ctx.universe,
+        "mod_sym": mod_sym,
+        "mod_scope": mod_sym.scope
+    }
+    for name in BUILTIN_TYPES:
+        typ = getattr(ctx, f"{name}_type")
+        shared[f"{name}_type"] = typ
+        shared[f"{name}_typesym"] = typ.typesym
+    return shared
+
+# The positions in the parsed file are stored without its path, and take the
+# one it is loaded with: the same file can be given as `a.bs` or `./a.bs`,
+# and the diagnostics must show the path of the current compilation.
+class AstPickler(pickle.Pickler):
+    def __init__(self, file, ctx, mod_sym, path):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.shared = {
+            id(obj): name
+            for name, obj in shared_objects(ctx, mod_sym).items()
+        }
+        self.file_id = source_map.file_id(path)
+
+    def persistent_id(self, obj):
+        if obj.__class__ is Pos and obj.file_id == self.file_id:
+            return (obj.start, obj.len, obj.at)
+        return self.shared.get(id(obj))
+
+class AstUnpickler(pickle.Unpickler):
+    def __init__(self, file, ctx, mod_sym, path):
+        super().__init__(file)
+        self.shared = shared_objects(ctx, mod_sym)
+        self.file_id = source_map.file_id(path)
+
+    def persistent_load(self, pid):
+        if isinstance(pid, tuple):
+            return Pos(self.file_id, *pid)
+        return self.shared[pid]
+
+def dumps_ast(ctx, mod_sym, path, decls, deps):
+    buf = io.BytesIO()
+    AstPickler(buf, ctx, mod_sym, path).dump((decls, deps))
+    return buf.getvalue()
+
+def loads_ast(ctx, mod_sym, path, data):
+    return AstUnpickler(io.BytesIO(data), ctx, mod_sym, path).load()
+
+# Stores the declarations produced by `AstGen.parse_file` in `bsc-out/.cache`,
+# one entry per source file. An entry is only used when the content of the
+# file, the grammar and the compiler are the same as when it was written.
+class AstCache:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, file, src):
+        h = hashlib.sha256(src.encode())
+        h.update(sources_hash().encode())
+        h.update(utils.VERSION.encode())
+        # `FnDecl.is_main` depends on the file being the compiler input
+        h.update(str(file == self.ctx.prefs.input).encode())
+        return h.hexdigest()
+
+    def entry_file(self, file):
+        name = hashlib.sha256(os.path.abspath(file).encode()).hexdigest()
+        return os.path.join(AST_CACHE_DIR, f"{name[:32]}.ast")
+
+    def load(self, file, key, mod_sym):
+        try:
+            with open(self.entry_file(file), "rb") as f:
+                unpickler = AstUnpickler(f, self.ctx, mod_sym, file)
+                if unpickler.load() != key:
+                    self.misses += 1
+                    return None
+                decls, deps = unpickler.load()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # corrupted or written by an incompatible compiler, parse again
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decls, deps
+
+    def store(self, file, key, mod_sym, decls, deps):
+        entry_file = self.entry_file(file)
+        tmp_file = f"{entry_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(AST_CACHE_DIR, exist_ok = True)
+            with open(tmp_file, "wb") as f:
+                pickler = AstPickler(f, self.ctx, mod_sym, file)
+                pickler.dump(key)
+                pickler.dump((decls, deps))
+            os.replace(tmp_file, entry_file)
+        except (OSError, RecursionError, pickle.PicklingError):
+            # the cache is only an optimization, compiling must go on
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
@@ -2,12 +2,28 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
+import os, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
 from bsc.sym import *
 from bsc.astgen.ast import *
 from bsc.codegen.lua_ast import *
 from bsc.codegen.lua_render import LuaRender
 from bsc.utils import BSC_OUT_DIR
 
+# what the workers of `Codegen.gen_files_in_parallel` generate; they are
+# forked once Sema has finished, so they inherit the checked ASTs instead of
+# receiving a pickled copy of them
+worker_ctx = None
+worker_files = []
+
+def gen_file_in_worker(index):
+    codegen = Codegen(worker_ctx)
+    codegen.gen_file(worker_files[index])
+    render = LuaRender(worker_ctx, codegen.modules)
+    render.render_modules()
+    return render.written, render.skipped
+
 class Codegen:
     def __init__(self, ctx):
         self.ctx = ctx
@@ -29,10 +45,99 @@ class Codegen:
             self.cur_sym = new_cur_sym
 
     def gen_files(self, source_files):
+        if self.ctx.prefs.is_bundle:
+            written, skipped = self.gen_bundle(source_files)
+        elif self.ctx.prefs.jobs > 1 and len(source_files) > 1 and (
+            "fork" in multiprocessing.get_all_start_methods()
+        ):
+            written, skipped = self.gen_files_in_parallel(source_files)
+        else:
+            for file in source_files:
+                self.gen_file(file)
+            render = LuaRender(self.ctx, self.modules)
+            render.render_modules()
+            written, skipped = render.written, render.skipped
+        self.ctx.vlog(
+            f"{written} Lua files written, {skipped} unchanged files skipped"
+        )
+
+    def gen_files_in_parallel(self, source_files):
+        # the modules do not depend on each other once they are checked, so
+        # each worker generates and writes whole modules, the same way the
+        # serial path does
+        global worker_ctx, worker_files
+        os.makedirs(BSC_OUT_DIR, exist_ok = True)
+        worker_ctx = self.ctx
+        worker_files = source_files
+        jobs = min(self.ctx.prefs.jobs, len(source_files))
+        try:
+            with ProcessPoolExecutor(
+                jobs, mp_context = multiprocessing.get_context("fork")
+            ) as pool:
+                # `list` raises the first exception of the workers, if any
+                counts = list(
+                    pool.map(
+                        gen_file_in_worker, range(len(source_files)),
+                        chunksize = max(1,
+                                        len(source_files) // (jobs * 4))
+                    )
+                )
+        finally:
+            worker_ctx = None
+            worker_files = []
+        return sum(c[0] for c in counts), sum(c[1] for c in counts)
+
+    def gen_bundle(self, source_files):
+        # the package module becomes the bundle: the other modules are
+        # generated as usual and wrapped in loaders, in dependency order,
+        # and `bsc_require` runs each loader the first time its module is
+        # imported, like `require` does with the files of the modules
+        if len(source_files) == 0:
+            return 0, 0
         for file in source_files:
             self.gen_file(file)
-        render = LuaRender(self.ctx, self.modules)
+        bundle = None
+        loaders = []
+        for file, module in zip(source_files, self.modules):
+            if file.mod_sym.is_pkg:
+                bundle = module
+                continue
+            loader = LuaFunction([])
+            loader.block = module.block
+            loaders.append(LuaComment(f"module `{file.mod_sym.qualname()}`"))
+            loaders.append(
+                LuaAssignment([
+                    LuaSelector(LuaIdent("bsc_loaders"), module.name)
+                ], [loader], False)
+            )
+        if len(loaders) > 0:
+            bundle.block.stmts[0:0] = self.bundle_runtime() + loaders
+        render = LuaRender(self.ctx, [bundle])
         render.render_modules()
+        return render.written, render.skipped
+
+    def bundle_runtime(self):
+        modules = LuaIdent("bsc_modules")
+        name = LuaIdent("name")
+        require = LuaFunction([name])
+        require.block.add_stmt(
+            LuaAssignment([LuaIdent("loader")],
+                          [LuaIndexExpr(LuaIdent("bsc_loaders"), name)])
+        )
+        require.block.add_stmt(
+            LuaAssignment([LuaIndexExpr(modules, name)], [
+                LuaBinaryExpr(
+                    LuaIndexExpr(modules, name), "or", LuaCallExpr("loader")
+                )
+            ], False)
+        )
+        require.block.add_stmt(LuaReturn(LuaIndexExpr(modules, name)))
+        return [
+            LuaComment("the loaders of the modules of the bundle"),
+            LuaAssignment([LuaIdent("bsc_loaders")], [LuaTable([])]),
+            LuaAssignment([modules], [LuaTable([])]),
+            LuaAssignment([LuaIdent("bsc_require")], [require])
+        ]
 
     def gen_file(self, file):
         self.cur_file = file
@@ -47,7 +152,6 @@ class Codegen:
         else:
             self.export_public_symbols(file.mod_sym, True)
 
-        self.cur_module.stmts = self.cur_block
         self.modules.append(self.cur_module)
         self.cur_block = LuaBlock()
         self.switch_cur_sym()
@@ -83,12 +187,16 @@ class Codegen:
             self.switch_cur_sym()
         else:
             self.cur_block.add_comment(f"extern module `{decl.sym.qualname()}`")
+            if self.ctx.prefs.is_bundle:
+                load_call = LuaCallExpr(
+                    "bsc_require", [LuaStringLit(decl.name)]
+                )
+            else:
+                load_call = LuaCallExpr(
+                    "require", [LuaStringLit(f"{BSC_OUT_DIR}.{decl.name}")]
+                )
             self.cur_block.add_stmt(
-                LuaAssignment([LuaIdent(decl.sym.name)], [
-                    LuaCallExpr(
-                        "require", [LuaStringLit(f"{BSC_OUT_DIR}.{decl.name}")]
-                    )
-                ])
+                LuaAssignment([LuaIdent(decl.sym.name)], [load_call])
             )
 
     def gen_const_decl(self, decl):
@@ -2,28 +2,40 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
+# Like the nodes of `bsc.astgen.ast`, these are declared with `__slots__`.
+
 class LuaSkip:
-    pass
+    __slots__ = ()
 
 class LuaComment:
+    __slots__ = ("comment", )
+
     def __init__(self, comment):
         self.comment = comment
 
 class LuaModule:
+    __slots__ = ("name", "block")
+
     def __init__(self, name):
         self.name = name
         self.block = LuaBlock()
 
 class LuaTableField:
+    __slots__ = ("key", "value")
+
     def __init__(self, key, value):
         self.key = key
         self.value = value
 
 class LuaTable:
+    __slots__ = ("fields", )
+
     def __init__(self, fields):
         self.fields = fields
 
 class LuaFunction:
+    __slots__ = ("args", "is_static", "block")
+
     def __init__(self, args, is_static = False):
         self.args = args
         self.is_static = is_static
@@ -32,26 +44,36 @@ class LuaFunction:
 # Statements
 
 class LuaWhile:
+    __slots__ = ("cond", "stmts")
+
     def __init__(self, cond, stmts = []):
         self.cond = cond
         self.stmts = stmts.copy()
 
 class LuaRepeat:
+    __slots__ = ("stmts", "cond")
+
     def __init__(self, cond, stmts = []):
         self.stmts = stmts.copy()
         self.cond = cond
 
 class LuaIf:
+    __slots__ = ("branches", )
+
     def __init__(self, branches):
         self.branches = branches
 
 class LuaIfBranch:
+    __slots__ = ("cond", "is_else", "stmts")
+
     def __init__(self, cond, is_else, stmts = []):
         self.cond = cond
         self.is_else = is_else
         self.stmts = stmts.copy()
 
 class LuaBlock:
+    __slots__ = ("stmts", )
+
     def __init__(self, stmts = []):
         self.stmts = stmts.copy()
 
@@ -62,33 +84,45 @@ class LuaBlock:
         self.stmts.append(stmt)
 
 class LuaAssignment:
+    __slots__ = ("is_local", "lefts", "rights")
+
     def __init__(self, lefts, rights, is_local = True):
         self.is_local = is_local
         self.lefts = lefts
         self.rights = rights
 
 class LuaReturn:
+    __slots__ = ("expr", )
+
     def __init__(self, expr):
         self.expr = expr
 
 # Expressions
 
 class LuaParenExpr:
+    __slots__ = ("expr", )
+
     def __init__(self, expr):
         self.expr = expr
 
 class LuaBinaryExpr:
+    __slots__ = ("left", "op", "right")
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
         self.right = right
 
 class LuaUnaryExpr:
+    __slots__ = ("op", "right")
+
     def __init__(self, op, right):
         self.op = op
         self.right = right
 
 class LuaCallExpr:
+    __slots__ = ("name", "args", "left", "is_method")
+
     def __init__(self, name, args = [], left = None, is_method = False):
         self.name = name
         self.args = args.copy()
@@ -96,26 +130,43 @@ class LuaCallExpr:
         self.is_method = is_method
 
 class LuaSelector:
+    __slots__ = ("left", "name")
+
     def __init__(self, left, name):
         self.left = left
         self.name = name
 
+class LuaIndexExpr:
+    __slots__ = ("left", "index")
+
+    def __init__(self, left, index):
+        self.left = left
+        self.index = index
+
 class LuaIdent:
+    __slots__ = ("name", )
+
     def __init__(self, name):
         self.name = name
 
 class LuaStringLit:
+    __slots__ = ("value", )
+
     def __init__(self, value):
         self.value = value
 
 class LuaNumberLit:
+    __slots__ = ("value", "is_float")
+
     def __init__(self, value, is_float = False):
         self.value = value
         self.is_float = is_float
 
 class LuaBooleanLit:
+    __slots__ = ("value", )
+
     def __init__(self, value):
         self.value = value
 
 class LuaNil:
-    pass
+    __slots__ = ()
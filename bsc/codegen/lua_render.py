@@ -2,11 +2,119 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
-import os
+import os, hashlib
 from bsc import utils
 from bsc.codegen.lua_ast import *
 from bsc.utils import BSC_OUT_DIR
 
+# The rendered code is written to the output file each time this many pieces
+# are pending, so big modules are never kept whole in memory.
+CHUNK_PIECES = 4096
+
+# How tightly the operators of Lua bind, used by `--minify` to only keep the
+# parentheses that change how an expression is parsed. The operators that are
+# not listed here are always parenthesized.
+BINARY_PRECEDENCE = {
+    "or": 1,
+    "and": 2,
+    "<": 3,
+    ">": 3,
+    "<=": 3,
+    ">=": 3,
+    "~=": 3,
+    "==": 3,
+    "|": 4,
+    "~": 5,
+    "&": 6,
+    "<<": 7,
+    ">>": 7,
+    "..": 9,
+    "+": 10,
+    "-": 10,
+    "*": 11,
+    "/": 11,
+    "//": 11,
+    "%": 11,
+    "^": 14
+}
+RIGHT_ASSOCIATIVE = ("..", "^")
+UNARY_PRECEDENCE = 12
+ATOM_PRECEDENCE = 15
+
+LUA_KEYWORDS = {
+    "and", "break", "do", "else", "elseif", "end", "false", "for", "function",
+    "goto", "if", "in", "local", "nil", "not", "or", "repeat", "return", "then",
+    "true", "until", "while"
+}
+NAME_START_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_"
+NAME_CHARS = NAME_START_CHARS + "0123456789"
+
+def short_name(n):
+    # the `n`-th shortest Lua name
+    name = NAME_START_CHARS[n % len(NAME_START_CHARS)]
+    n //= len(NAME_START_CHARS)
+    while n > 0:
+        n -= 1
+        name += NAME_CHARS[n % len(NAME_CHARS)]
+        n //= len(NAME_CHARS)
+    return name
+
+def is_name_char(c):
+    return c.isalnum() or c == "_"
+
+# The short names given to the locals of a module with `--minify-locals`. The
+# locals of a scope never shadow the ones of the enclosing scopes, and never
+# take a name that is used anywhere in the module, so globals are not hidden.
+class LocalNames:
+    def __init__(self, reserved):
+        self.reserved = reserved
+        self.scopes = [{}]
+        self.counts = [0]
+
+    def open_scope(self):
+        self.scopes.append({})
+        self.counts.append(self.counts[-1])
+
+    def close_scope(self):
+        self.scopes.pop()
+        self.counts.pop()
+
+    def new_name(self):
+        while True:
+            name = short_name(self.counts[-1])
+            self.counts[-1] += 1
+            if name not in self.reserved:
+                return name
+
+    def declare(self, name, short):
+        self.scopes[-1][name] = short
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            if short := scope.get(name):
+                return short
+        return name
+
+    @staticmethod
+    def used_names(module):
+        # every name that the code of `module` may use for a variable
+        names = set(LUA_KEYWORDS)
+        stack = [module.block]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if isinstance(node, LuaIdent):
+                names.add(node.name)
+            elif isinstance(node, LuaCallExpr) and node.left == None:
+                names.add(node.name)
+            for slot in getattr(type(node), "__slots__", ()):
+                value = getattr(node, slot)
+                if not isinstance(value, (str, bool)) and value != None:
+                    stack.append(value)
+        return names
+
 class LuaRender:
     def __init__(self, ctx, modules):
         self.ctx = ctx
@@ -15,8 +123,23 @@ class LuaRender:
         self.cur_module = None
 
         self.indent = 0
+        self.indents = [""] # `indents[n]` is the prefix of `n` levels
         self.empty_line = True
-        self.lua_file = utils.Builder()
+        self.lua_file = None
+        self.lua_hash = None
+        self.pieces = []
+
+        self.written = 0
+        self.skipped = 0
+
+        # with `--minify`, the pieces are written without the spaces around
+        # them, and a space is only added between two pieces that would
+        # otherwise be read as a single token; `stmt_end` is set between two
+        # statements of a block
+        self.minify = ctx.prefs.is_minify
+        self.last_piece = ""
+        self.stmt_end = False
+        self.local_names = None
 
     def render_modules(self):
         if not os.path.exists(BSC_OUT_DIR):
@@ -26,26 +149,78 @@ class LuaRender:
             self.render_module(module)
 
     def render_module(self, module):
-        self.writeln(
-            f"-- Autogenerated by the BlueScript compiler - {utils.full_version()}"
-        )
-        self.writeln(
-            "-- WARNING: DO NOT MODIFY MANUALLY! YOUR CHANGES WILL BE OVERWRITTEN --\n"
-        )
+        # the code is rendered to a temporary file, which only replaces the
+        # output file if their contents differ, so unchanged modules keep
+        # their mtime and do not trigger reloads
+        lua_file = f"{BSC_OUT_DIR}/{module.name}.lua"
+        tmp_file = f"{lua_file}.{os.getpid()}.tmp"
+        self.lua_hash = hashlib.sha256()
+        try:
+            with open(tmp_file, "wb") as f:
+                self.lua_file = f
+                self.last_piece = ""
+                self.stmt_end = False
+                if self.ctx.prefs.minify_locals:
+                    self.local_names = LocalNames(LocalNames.used_names(module))
+                if self.ctx.prefs.show_banner and not self.minify:
+                    self.writeln(
+                        f"-- Autogenerated by the BlueScript compiler - {utils.full_version()}"
+                    )
+                    self.writeln(
+                        "-- WARNING: DO NOT MODIFY MANUALLY! YOUR CHANGES WILL BE OVERWRITTEN --\n"
+                    )
 
-        self.render_stmts(module.block.stmts)
+                self.render_stmts(module.block.stmts)
+                self.flush()
+            if self.same_contents(lua_file, tmp_file):
+                os.remove(tmp_file)
+                self.skipped += 1
+            else:
+                os.replace(tmp_file, lua_file)
+                self.written += 1
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        finally:
+            self.lua_file = None
+            self.lua_hash = None
+            self.local_names = None
 
-        with open(f"{BSC_OUT_DIR}/{module.name}.lua", "w") as f:
-            f.write(str(self.lua_file))
-        self.lua_file.clear()
+    def same_contents(self, lua_file, tmp_file):
+        # `lua_hash` is the hash of the contents of `tmp_file`
+        try:
+            if os.path.getsize(lua_file) != os.path.getsize(tmp_file):
+                return False
+            h = hashlib.sha256()
+            with open(lua_file, "rb") as f:
+                while chunk := f.read(1 << 16):
+                    h.update(chunk)
+        except OSError:
+            return False # the output file does not exist yet
+        return h.digest() == self.lua_hash.digest()
 
     def render_stmts(self, stmts):
+        if self.minify:
+            self.render_minified_stmts(stmts)
+            return
         for stmt in stmts:
             self.render_stmt(stmt)
 
+    def render_minified_stmts(self, stmts):
+        is_first = True
+        for stmt in stmts:
+            if isinstance(stmt, (LuaComment, LuaSkip)):
+                continue
+            # Lua 5.1 does not accept a `;` before the first statement
+            self.stmt_end = not is_first
+            self.render_stmt(stmt)
+            is_first = False
+
     def render_stmt(self, stmt):
         if isinstance(stmt, LuaComment):
-            self.writeln(f"-- {stmt.comment}")
+            if not self.minify:
+                self.writeln(f"-- {stmt.comment}")
         elif isinstance(stmt, LuaFunction):
             self.render_fn_stmt(stmt)
         elif isinstance(stmt, LuaTable):
@@ -57,16 +232,20 @@ class LuaRender:
             self.render_expr(stmt.cond)
             self.writeln(" do")
             self.indent += 1
+            self.open_scope()
             self.render_stmts(stmt.stmts)
+            self.close_scope()
             self.indent -= 1
             self.writeln("end")
         elif isinstance(stmt, LuaRepeat):
             self.writeln("repeat")
             self.indent += 1
+            self.open_scope()
             self.render_stmts(stmt.stmts)
             self.indent -= 1
             self.write("until ")
-            self.render_expr(stmt.cond)
+            self.render_expr(stmt.cond) # the locals of the body are visible
+            self.close_scope()
             self.writeln()
         elif isinstance(stmt, LuaIf):
             for i, branch in enumerate(stmt.branches):
@@ -76,13 +255,17 @@ class LuaRender:
                     self.write("if " if i == 0 else "elseif ")
                     self.render_expr(branch.cond)
                 self.indent += 1
+                self.open_scope()
                 self.render_stmts(branch.stmts)
+                self.close_scope()
                 self.indent -= 1
             self.writeln("end")
         elif isinstance(stmt, LuaBlock):
             self.writeln("do")
             self.indent += 1
+            self.open_scope()
             self.render_stmts(stmt.stmts)
+            self.close_scope()
             self.indent -= 1
             self.writeln("end\n")
         elif isinstance(stmt, LuaReturn):
@@ -95,9 +278,17 @@ class LuaRender:
             self.render_expr(stmt) # support for using expressions as statements
 
     def render_assign_stmt(self, stmt):
-        if stmt.is_local: self.write("local ")
+        names = None
+        if stmt.is_local:
+            self.write("local ")
+            if self.local_names != None:
+                # the new locals are only visible after the assignment
+                names = [self.local_names.new_name() for _ in stmt.lefts]
         for i, left in enumerate(stmt.lefts):
-            self.render_expr(left)
+            if names != None:
+                self.write(names[i])
+            else:
+                self.render_expr(left)
             if i < len(stmt.lefts) - 1:
                 self.write(", ")
         if len(stmt.rights) > 0:
@@ -106,6 +297,9 @@ class LuaRender:
                 self.render_expr(right)
                 if i < len(stmt.rights) - 1:
                     self.write(", ")
+        if names != None:
+            for left, name in zip(stmt.lefts, names):
+                self.local_names.declare(left.name, name)
         self.writeln()
 
     def render_expr(self, expr):
@@ -115,13 +309,15 @@ class LuaRender:
             self.write(")")
         elif isinstance(expr, LuaFunction):
             self.write(f"function(")
+            self.open_scope()
             for i, arg in enumerate(expr.args):
-                self.write(arg.name)
+                self.write(self.declare_local(arg.name))
                 if i < len(expr.args) - 1:
                     self.write(", ")
             self.writeln(")")
             self.indent += 1
             self.render_stmts(expr.block.stmts)
+            self.close_scope()
             self.indent -= 1
             self.writeln("end\n")
         elif isinstance(expr, LuaTable):
@@ -132,11 +328,11 @@ class LuaRender:
             self.indent += 1
             for i, field in enumerate(expr.fields):
                 if field.key != None:
-                    needs_brackets = not isinstance(field.key, LuaIdent)
-                    if needs_brackets:
+                    if isinstance(field.key, LuaIdent):
+                        self.write(field.key.name) # a field, not a variable
+                    else:
                         self.write("[")
-                    self.render_expr(field.key)
-                    if needs_brackets:
+                        self.render_expr(field.key)
                         self.write("]")
                     self.write(" = ")
                 self.render_expr(field.value)
@@ -147,25 +343,34 @@ class LuaRender:
             self.indent -= 1
             self.write("}")
         elif isinstance(expr, LuaBinaryExpr):
+            if self.minify:
+                self.render_binary_expr(expr)
+                return
             self.write("(")
             self.render_expr(expr.left)
             self.write(f" {expr.op} ")
             self.render_expr(expr.right)
             self.write(")")
         elif isinstance(expr, LuaUnaryExpr):
+            if self.minify:
+                self.write(expr.op)
+                self.render_operand(expr.right, UNARY_PRECEDENCE)
+                return
             self.write("(")
             self.write(expr.op)
             self.render_expr(expr.right)
             self.write(")")
         elif isinstance(expr, LuaCallExpr):
             if expr.left != None:
-                self.render_expr(expr.left)
+                self.render_operand(expr.left, ATOM_PRECEDENCE)
                 if expr.is_method:
                     self.write(":")
                 else:
                     self.write(".")
-            if len(expr.name) > 0:
-                self.write(expr.name)
+                if len(expr.name) > 0:
+                    self.write(expr.name)
+            elif len(expr.name) > 0:
+                self.write(self.lookup_local(expr.name))
             self.write("(")
             for i, arg in enumerate(expr.args):
                 self.render_expr(arg)
@@ -173,10 +378,15 @@ class LuaRender:
                     self.write(", ")
             self.write(")")
         elif isinstance(expr, LuaSelector):
-            self.render_expr(expr.left)
+            self.render_operand(expr.left, ATOM_PRECEDENCE)
             self.write(f".{expr.name}")
+        elif isinstance(expr, LuaIndexExpr):
+            self.render_operand(expr.left, ATOM_PRECEDENCE)
+            self.write("[")
+            self.render_expr(expr.index)
+            self.write("]")
         elif isinstance(expr, LuaIdent):
-            self.write(expr.name)
+            self.write(self.lookup_local(expr.name))
         elif isinstance(expr, LuaStringLit):
             self.write(f'"{expr.value}"')
         elif isinstance(expr, LuaNumberLit):
@@ -189,16 +399,123 @@ class LuaRender:
         elif isinstance(expr, LuaNil):
             self.write("nil")
 
+    def render_binary_expr(self, expr):
+        precedence = BINARY_PRECEDENCE.get(expr.op, 0)
+        if precedence == 0:
+            self.write("(")
+        if expr.op in RIGHT_ASSOCIATIVE:
+            self.render_operand(expr.left, precedence + 1)
+            self.write(expr.op)
+            self.render_operand(expr.right, precedence)
+        else:
+            self.render_operand(expr.left, precedence)
+            self.write(expr.op)
+            self.render_operand(expr.right, precedence + 1)
+        if precedence == 0:
+            self.write(")")
+
+    def render_operand(self, expr, min_precedence):
+        # outside of `--minify`, the binary and unary expressions are always
+        # parenthesized
+        if not self.minify:
+            self.render_expr(expr)
+        elif self.precedence(expr) < min_precedence:
+            self.write("(")
+            self.render_expr(expr)
+            self.write(")")
+        else:
+            self.render_expr(expr)
+
+    def precedence(self, expr):
+        if isinstance(expr, LuaBinaryExpr):
+            return BINARY_PRECEDENCE.get(expr.op, ATOM_PRECEDENCE)
+        elif isinstance(expr, LuaUnaryExpr):
+            return UNARY_PRECEDENCE
+        return ATOM_PRECEDENCE
+
+    ## Local names
+
+    def open_scope(self):
+        if self.local_names != None:
+            self.local_names.open_scope()
+
+    def close_scope(self):
+        if self.local_names != None:
+            self.local_names.close_scope()
+
+    def declare_local(self, name):
+        if self.local_names == None:
+            return name
+        short = self.local_names.new_name()
+        self.local_names.declare(name, short)
+        return short
+
+    def lookup_local(self, name):
+        if self.local_names == None:
+            return name
+        return self.local_names.lookup(name)
+
     ## Utils
 
     def write(self, s):
-        if self.indent > 0 and self.empty_line:
-            self.lua_file.write("\t" * self.indent)
-        self.lua_file.write(s)
-        self.empty_line = False
+        if self.minify:
+            self.write_minified(s)
+            return
+        if self.empty_line:
+            if self.indent > 0:
+                self.pieces.append(self.indent_prefix())
+            self.empty_line = False
+        self.pieces.append(s)
+        if len(self.pieces) >= CHUNK_PIECES:
+            self.flush()
 
     def writeln(self, s = ""):
-        if self.indent > 0 and self.empty_line:
-            self.lua_file.write("\t" * self.indent)
-        self.lua_file.writeln(s)
+        if self.minify:
+            self.write_minified(s)
+            return
+        if self.empty_line and self.indent > 0:
+            self.pieces.append(self.indent_prefix())
+        self.pieces.append(s)
+        self.pieces.append("\n")
         self.empty_line = True
+        if len(self.pieces) >= CHUNK_PIECES:
+            self.flush()
+
+    def write_minified(self, s):
+        s = s.strip(" \n")
+        if len(s) == 0:
+            return
+        if self.stmt_end and s[0] == "(":
+            # otherwise it would be read as a call by the previous statement
+            self.pieces.append(";")
+        elif self.needs_space(self.last_piece, s):
+            self.pieces.append(" ")
+        self.pieces.append(s)
+        self.last_piece = s
+        self.stmt_end = False
+        if len(self.pieces) >= CHUNK_PIECES:
+            self.flush()
+
+    def needs_space(self, last, s):
+        # whether `last` and `s` would be read as a single token, or as the
+        # start of a comment or a long string
+        if len(last) == 0:
+            return False
+        if is_name_char(last[-1]) and is_name_char(s[0]):
+            return True
+        if last[-1] == s[0] and s[0] in "-.[":
+            return True
+        # the numbers can go on with a `.`, and with a sign after an exponent
+        return last[0].isdigit(
+        ) and (s[0] == "." or last[-1] in "eEpP" and s[0] in "+-")
+
+    def indent_prefix(self):
+        while len(self.indents) <= self.indent:
+            self.indents.append("\t" * len(self.indents))
+        return self.indents[self.indent]
+
+    def flush(self):
+        chunk = "".join(self.pieces).encode()
+        self.lua_file.write(chunk)
+        self.lua_hash.update(chunk)
+        self.pieces.clear()
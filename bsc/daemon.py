@@ -0,0 +1,149 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# `bsc daemon` keeps a compiler loaded and serves the compilations requested
+# by `bsc client ARGS...` over a Unix domain socket. Each request carries
+# the arguments and the working directory of the client, and its response
+# the output, the diagnostics and the exit code of the compilation.
+#
+# The client is loaded by `__main__.py` without importing the `bsc` package,
+# so this module must only import the standard library at the top level.
+
+import os, sys, json, socket, struct, tempfile, argparse, traceback
+from io import StringIO
+from contextlib import redirect_stdout, redirect_stderr
+
+SOCKET_FILE = os.getenv(
+    "BSC_DAEMON_SOCKET",
+    os.path.join(tempfile.gettempdir(), f"bsc-daemon-{os.getuid()}.sock")
+)
+
+def send_msg(conn, msg):
+    data = json.dumps(msg).encode()
+    conn.sendall(struct.pack(">I", len(data)) + data)
+
+def recv_exactly(conn, size):
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed by the other end")
+        data += chunk
+    return data
+
+def recv_msg(conn):
+    (size, ) = struct.unpack(">I", recv_exactly(conn, 4))
+    return json.loads(recv_exactly(conn, size))
+
+def request(msg):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(SOCKET_FILE)
+        send_msg(conn, msg)
+        return recv_msg(conn)
+
+def run_client(argv):
+    # returns `None` when the daemon is not running, so the caller can
+    # compile in this process instead
+    try:
+        response = request({
+            "cwd": os.getcwd(),
+            "argv": argv,
+            "colors": sys.stdout.isatty() and sys.stderr.isatty()
+        })
+    except (FileNotFoundError, ConnectionError):
+        return None
+    sys.stdout.write(response["out"])
+    sys.stderr.write(response["err"])
+    return response["exit_code"]
+
+def run_daemon(argv):
+    parser = argparse.ArgumentParser(
+        prog = 'bsc daemon', description =
+        'Keeps the BlueScript compiler loaded and serves the compilations requested by `bsc client`'
+    )
+    parser.add_argument(
+        '--stop', action = 'store_true', help = 'stops the running daemon'
+    )
+    args = parser.parse_args(argv)
+    if args.stop:
+        try:
+            request({ "stop": True })
+        except (FileNotFoundError, ConnectionError):
+            print("bsc: the daemon is not running", file = sys.stderr)
+            return 1
+        return 0
+    return serve()
+
+def is_daemon_running():
+    # a socket file is also left behind by a daemon that was killed, but
+    # nothing accepts connections on it anymore
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(SOCKET_FILE)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+def serve():
+    if os.path.exists(SOCKET_FILE):
+        if is_daemon_running():
+            print(
+                f"bsc: a daemon is already listening on `{SOCKET_FILE}`",
+                file = sys.stderr
+            )
+            return 1
+        os.remove(SOCKET_FILE)
+    from bsc import Context
+    ctx = Context()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(SOCKET_FILE)
+        server.listen()
+        print(f"bsc: daemon listening on `{SOCKET_FILE}`")
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn:
+                    try:
+                        msg = recv_msg(conn)
+                        if msg.get("stop"):
+                            send_msg(conn, {})
+                            break
+                        send_msg(conn, compile_request(ctx, msg))
+                    except (ConnectionError, ValueError, struct.error):
+                        pass # the client went away or sent garbage
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(SOCKET_FILE)
+    return 0
+
+def compile_request(ctx, msg):
+    from bsc import utils
+    out, err = StringIO(), StringIO()
+    exit_code = 0
+    daemon_cwd = os.getcwd()
+    utils.show_colors = msg["colors"]
+    try:
+        with redirect_stdout(out), redirect_stderr(err):
+            os.chdir(msg["cwd"])
+            exit_code = ctx.recompile(msg["argv"]).exit_code
+    except SystemExit as e:
+        # `exit` is still used by argparse and the checks of the arguments
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code != None:
+            err.write(f"{e.code}\n")
+            exit_code = 1
+    except Exception:
+        # a bug in the compiler must not take the daemon down
+        err.write(traceback.format_exc())
+        exit_code = 1
+    finally:
+        os.chdir(daemon_cwd)
+        utils.show_colors = None
+    return {
+        "out": out.getvalue(),
+        "err": err.getvalue(),
+        "exit_code": exit_code
+    }
@@ -0,0 +1,160 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import os, glob, json, hashlib
+
+from bsc import utils
+from bsc.astgen.ast import (
+    ExternPkg, ModDecl, EnumDecl, FnDecl, ConstDecl, VarDecl
+)
+from bsc.utils import BSC_OUT_DIR
+
+MANIFEST_FILE = os.path.join(BSC_OUT_DIR, ".cache", "manifest.json")
+
+compiler_hash_ = ""
+
+def compiler_hash():
+    # the generated code depends on every part of the compiler
+    global compiler_hash_
+    if compiler_hash_ == "":
+        h = hashlib.sha256(utils.VERSION.encode())
+        bsc_dir = os.path.dirname(__file__)
+        sources = []
+        for pattern in ("*.py", "*.lark"):
+            sources += glob.glob(
+                os.path.join(bsc_dir, "**", pattern), recursive = True
+            )
+        for source in sorted(sources):
+            with open(source, "rb") as f:
+                h.update(f.read())
+        compiler_hash_ = h.hexdigest()
+    return compiler_hash_
+
+def decls_interface(decls, lines):
+    # what the other modules can see of the declarations: the signatures of
+    # the functions without their bodies, and the type of the constants and
+    # variables (or the expression it is inferred from)
+    for decl in decls:
+        if isinstance(decl, ExternPkg):
+            lines.append(f"extern pkg {decl.pkg_name} as {decl.alias_name}")
+        elif isinstance(decl, ModDecl):
+            lines.append(f"{decl.access_modifier} mod {decl.name}")
+            if decl.is_inline:
+                decls_interface(decl.decls, lines)
+                lines.append("end")
+        elif isinstance(decl, EnumDecl):
+            fields = ", ".join([field.name for field in decl.fields])
+            lines.append(f"{decl.access_modifier} enum {decl.name} {fields}")
+            decls_interface(decl.decls, lines)
+            lines.append("end")
+        elif isinstance(decl, FnDecl):
+            args = ", ".join([
+                f"{arg.name}: {arg.type} = {arg.default_value}"
+                for arg in decl.args
+            ])
+            lines.append(
+                f"{decl.access_modifier} fn {decl.name}({args}) {decl.ret_type}"
+            )
+        elif isinstance(decl, ConstDecl):
+            lines.append(
+                f"{decl.access_modifier} const {decl.name}: {decl.typ} = {decl.expr}"
+            )
+        elif isinstance(decl, VarDecl):
+            lefts = ", ".join([
+                f"{left.name}: {left.typ}" for left in decl.lefts
+            ])
+            lines.append(f"{decl.access_modifier} var {lefts} = {decl.right}")
+    return lines
+
+# Stores the resolved module graph of the last successful build in
+# `bsc-out/.cache/manifest.json`, with the hash of the source and of the
+# interface of each module. The interface hash of a module includes the
+# interface hashes of its dependencies, so a change in the interface of a
+# module also marks as changed every module that (indirectly) imports it.
+class Manifest:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.modules = {}
+
+    def key(self):
+        prefs = self.ctx.prefs
+        return hashlib.sha256(
+            "\n".join([
+                compiler_hash(),
+                os.path.abspath(prefs.input), prefs.pkg_name,
+                str(prefs.is_library),
+                str(prefs.show_banner),
+                str(prefs.is_bundle),
+                str(prefs.is_minify),
+                str(prefs.minify_locals)
+            ]).encode()
+        ).hexdigest()
+
+    def load(self):
+        self.modules = {}
+        try:
+            with open(MANIFEST_FILE) as f:
+                manifest = json.load(f)
+            if manifest["key"] != self.key():
+                return
+            for module in manifest["modules"]:
+                self.modules[module["name"]] = module
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing or corrupted, everything is compiled again
+            self.modules = {}
+
+    def changed_files(self, source_files):
+        # `source_files` is in dependency order, so the interface hash of the
+        # dependencies of a module is known before the module is visited
+        self.load()
+        old_modules = self.modules
+        self.modules = {}
+        changed_files = []
+        for sf in source_files:
+            name = sf.mod_sym.qualname()
+            deps = self.ctx.modules.deps_of(sf)
+            interface = hashlib.sha256(
+                "\n".join(decls_interface(sf.decls, [])).encode()
+            )
+            for dep in deps:
+                if dep_module := self.modules.get(dep):
+                    interface.update(dep_module["interface"].encode())
+            module = {
+                "name": name,
+                "file": sf.file,
+                "hash": sf.src_hash,
+                "interface": interface.hexdigest(),
+                "deps": deps,
+                "output": self.output_file(sf)
+            }
+            self.modules[name] = module
+            old_module = old_modules.get(name)
+            if old_module == None or any(
+                old_module.get(field) != module[field]
+                for field in ("file", "hash", "interface", "deps")
+            ) or not os.path.isfile(module["output"]):
+                changed_files.append(sf)
+        return changed_files
+
+    def output_file(self, sf):
+        # with `--bundle`, every module is generated into the file of the
+        # package module
+        if self.ctx.prefs.is_bundle:
+            return os.path.join(BSC_OUT_DIR, f"{self.ctx.prefs.pkg_name}.lua")
+        return os.path.join(BSC_OUT_DIR, f"{sf.mod_sym.name}.lua")
+
+    def save(self):
+        tmp_file = f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok = True)
+            with open(tmp_file, "w") as f:
+                json.dump({
+                    "key": self.key(),
+                    "modules": list(self.modules.values())
+                }, f, indent = 1)
+            os.replace(tmp_file, MANIFEST_FILE)
+        except OSError:
+            # the next build will compile everything again
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
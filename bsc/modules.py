@@ -0,0 +1,32 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# The source files of the package by the qualified name of their module,
+# with the qualified names of the modules each one imports. Both are
+# computed once, when the file is added by `Context.add_source_file`, and
+# are then used to build the module graph, to order the source files after
+# resolving it and to compare them with the last build.
+class ModuleIndex:
+    def __init__(self):
+        self.files = {}
+        self.deps = {}
+
+    def add(self, sf):
+        name = sf.mod_sym.qualname()
+        deps = []
+        for dep in sf.deps:
+            # the modules declared with `mod name;` are only registered in
+            # the package when their own file is imported
+            dep.parent = sf.mod_sym
+            deps.append(dep.qualname())
+        self.files[name] = sf
+        self.deps[name] = deps
+        return name
+
+    def deps_of(self, sf):
+        return self.deps[sf.mod_sym.qualname()]
+
+    def ordered(self, names):
+        # the source files of `names`, in that order
+        return [self.files[name] for name in names]
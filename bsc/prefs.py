@@ -13,9 +13,20 @@ class Prefs:
 
         self.pkg_name = ""
         self.is_check = False
+        self.is_watch = False
         self.is_verbose = False
 
-    def parse_args(self):
+        self.parser = "lalr"
+        self.use_parse_tree = False
+        self.use_ast_cache = True
+        self.is_incremental = True
+        self.jobs = 1
+        self.show_banner = True
+        self.is_bundle = False
+        self.is_minify = False
+        self.minify_locals = False
+
+    def parse_args(self, argv = None):
         parser = argparse.ArgumentParser(
             prog = 'bsc', description = 'The BlueScript compiler'
         )
@@ -32,16 +43,68 @@ class Prefs:
             '--check', action = 'store_true',
             help = 'scans, parses, and checks the files without compiling.'
         )
+        parser.add_argument(
+            '--watch', action = 'store_true', help =
+            'keeps the compiler running and compiles the input again each time one of its files changes'
+        )
+        parser.add_argument(
+            '--parser', action = 'store', choices = ["lalr", "earley"],
+            default = "lalr", help =
+            'selects the parsing algorithm, `earley` is slower but more permissive (by default `lalr` is used)'
+        )
+        parser.add_argument(
+            '--debug-parse-tree', action = 'store_true', help =
+            'builds the full parse tree before generating the AST, instead of generating it while parsing (always done with `--parser=earley`)'
+        )
+        parser.add_argument(
+            '--no-cache', action = 'store_true', help =
+            'parses every file again, instead of loading the unchanged ones from `bsc-out/.cache`'
+        )
+        parser.add_argument(
+            '--no-incremental', action = 'store_true', help =
+            'checks and generates every module again, instead of only the ones affected by the changes since the last build'
+        )
+        parser.add_argument(
+            '--no-banner', action = 'store_true', help =
+            'omits the header with the compiler version from the generated files, so they only depend on the input'
+        )
+        parser.add_argument(
+            '--bundle', action = 'store_true', help =
+            'generates a single file with every module of the package, instead of one file per module'
+        )
+        parser.add_argument(
+            '--minify', action = 'store_true', help =
+            'generates the code without comments, indentation or redundant parentheses, to make it smaller'
+        )
+        parser.add_argument(
+            '--minify-locals', action = 'store_true', help =
+            'like `--minify`, but also gives the shortest possible names to the local variables'
+        )
+        parser.add_argument(
+            '-j', '--jobs', action = 'store', type = int, default = 1,
+            metavar = 'N', help =
+            'number of processes used to parse the imported modules and to generate the code (by default 1, 0 uses one per CPU)'
+        )
         parser.add_argument(
             '-v', '--verbose', action = 'store_true',
             help = 'enable verbosity in the compiler while compiling'
         )
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
 
         self.is_library = args.lib
         self.pkg_name = args.pkg_name or ""
         self.is_check = args.check
+        self.is_watch = args.watch
         self.is_verbose = args.verbose
+        self.parser = args.parser
+        self.use_parse_tree = args.debug_parse_tree
+        self.use_ast_cache = not args.no_cache
+        self.is_incremental = not args.no_incremental
+        self.jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+        self.show_banner = not args.no_banner
+        self.is_bundle = args.bundle
+        self.minify_locals = args.minify_locals
+        self.is_minify = args.minify or self.minify_locals
 
         # check input file
         self.input = args.INPUT[0]
@@ -2,36 +2,84 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
+from enum import IntEnum, auto
+
 from bsc import utils
 
-errors = 0
-
-def _format(pos, kind, kindc, msg):
-    return "{} {}".format(
-        utils.bold(
-            "{}:{}:{}: {}".format(pos.file, pos.line, pos.column, kindc(kind))
-        ), msg
-    )
-
-def error(msg, pos, notes_ = []):
-    global errors
-    utils.eprint(_format(pos, "error:", utils.red, msg))
-    notes(notes_)
-    errors += 1
-
-def warn(msg, pos, notes_ = []):
-    utils.eprint(_format(pos, "warning:", utils.yellow, msg))
-    notes(notes_)
-
-def notes(notes):
-    for i, note in enumerate(notes):
-        _char = "└" if i == len(notes) - 1 else "├"
-        utils.eprint(utils.bold(utils.cyan(f"   {_char} note: ")) + note)
-
-def error_from_ce(ce, pos):
-    error(ce.args[0], pos)
-    notes(ce.args[1:])
-
-def warn_from_ce(ce, pos):
-    warn(ce.args[0], pos)
-    notes(ce.args[1:])
+class DiagnosticKind(IntEnum):
+    error = auto()
+    warning = auto()
+
+    def __str__(self):
+        match self:
+            case DiagnosticKind.error:
+                return "error:"
+            case DiagnosticKind.warning:
+                return "warning:"
+            case _:
+                assert False # unreachable
+
+class Diagnostic:
+    # `pos` is `None` for the errors that do not belong to a file, like an
+    # import cycle
+    def __init__(self, kind, msg, pos = None, notes = []):
+        self.kind = kind
+        self.msg = msg
+        self.pos = pos
+        self.notes = notes
+
+    def __str__(self):
+        kindc = utils.red if self.kind == DiagnosticKind.error else utils.yellow
+        if self.pos == None:
+            res = f"{utils.bold('bsc: ' + kindc(str(self.kind)))} {self.msg}"
+        else:
+            line, column = self.pos.line_column()
+            res = "{} {}".format(
+                utils.bold(
+                    "{}:{}:{}: {}".format(
+                        self.pos.file, line, column, kindc(str(self.kind))
+                    )
+                ), self.msg
+            )
+        for i, note in enumerate(self.notes):
+            _char = "└" if i == len(self.notes) - 1 else "├"
+            res += "\n" + utils.bold(utils.cyan(f"   {_char} note: ")) + note
+        return res
+
+# The diagnostics of a compilation, owned by its context. They are kept in
+# the order they were reported and, unless `echo` is disabled, also printed
+# to stderr as soon as they are reported.
+class Report:
+    def __init__(self, echo = True):
+        self.echo = echo
+        self.diagnostics = []
+        self.errors = 0
+        self.warnings = 0
+
+    def add(self, diagnostic):
+        self.diagnostics.append(diagnostic)
+        if diagnostic.kind == DiagnosticKind.error:
+            self.errors += 1
+        else:
+            self.warnings += 1
+        if self.echo:
+            utils.eprint(diagnostic)
+
+    def extend(self, diagnostics):
+        for diagnostic in diagnostics:
+            self.add(diagnostic)
+
+    def error(self, msg, pos = None, notes = []):
+        self.add(Diagnostic(DiagnosticKind.error, msg, pos, notes))
+
+    def warn(self, msg, pos = None, notes = []):
+        self.add(Diagnostic(DiagnosticKind.warning, msg, pos, notes))
+
+    def error_from_ce(self, ce, pos):
+        self.error(ce.args[0], pos, list(ce.args[1:]))
+
+    def warn_from_ce(self, ce, pos):
+        self.warn(ce.args[0], pos, list(ce.args[1:]))
+
+    def __str__(self):
+        return "\n".join([str(diagnostic) for diagnostic in self.diagnostics])
@@ -4,15 +4,23 @@
 
 from bsc.sym import *
 from bsc.astgen.ast import *
-from bsc import utils, report
+from bsc import utils
 
 class Sema:
     def __init__(self, ctx):
         self.ctx = ctx
 
-        # In the first pass we register the symbols.
+        # In the first pass we register the symbols of the declarations, the
+        # second one checks them and the bodies of the functions, registering
+        # the local symbols of each block before checking its statements.
         self.first_pass = True
 
+        # The bodies of the functions are only checked for these files, the
+        # declarations of the other ones are still needed by them (`None`
+        # means all the files).
+        self.changed_files = None
+        self.check_bodies = True
+
         self.cur_file = None
         self.cur_pkg = None # is used for the expression `pkg::`
         self.cur_mod = None # is used for the expression `self::`
@@ -21,7 +29,9 @@ class Sema:
         self.cur_scope = self.ctx.universe
         self.old_scope = None
 
-    def check_files(self, files):
+    def check_files(self, files, changed_files = None):
+        if changed_files != None:
+            self.changed_files = set(changed_files)
         self.check_files_(files)
         self.first_pass = False
         self.check_files_(files)
@@ -32,6 +42,9 @@ class Sema:
 
     def check_file(self, file):
         self.cur_file = file
+        self.check_bodies = self.changed_files == None or (
+            file in self.changed_files
+        )
         if file.mod_sym.is_pkg:
             self.cur_pkg = file.mod_sym
         self.cur_mod = file.mod_sym
@@ -97,7 +110,9 @@ class Sema:
             self.close_scope()
             return
         if len(decl.fields) == 0:
-            report.error(f"enum `{decl.name}` cannot be empty", decl.pos)
+            self.ctx.report.error(
+                f"enum `{decl.name}` cannot be empty", decl.pos
+            )
         self.cur_sym = decl.sym
         self.check_decls(decl.decls)
         self.cur_sym = old_sym
@@ -106,6 +121,9 @@ class Sema:
         old_sym = self.cur_sym
         old_scope = self.cur_scope
         if self.first_pass:
+            for arg in decl.args:
+                arg.type = self.resolve_type(arg.type)
+            decl.ret_type = self.resolve_type(decl.ret_type)
             decl.sym = Function(
                 decl.access_modifier, decl.name,
                 list(
@@ -126,85 +144,101 @@ class Sema:
                         arg.type, self.cur_scope
                     ), arg.pos
                 )
-            if decl.has_body:
-                self.check_stmts(decl.stmts)
             self.cur_sym = old_sym
             self.close_scope()
-            if len(decl.sym.scope.syms) > 200:
-                report.error(
-                    f"function `{decl.name}` exceeded the maximum number of local variables allowed (200)",
-                    decl.pos
-                )
             return
-        if decl.has_body:
+        if decl.has_body and self.check_bodies:
             self.cur_sym = decl.sym
             self.cur_scope = decl.sym.scope
             self.check_stmts(decl.stmts)
             self.cur_scope = old_scope
             self.cur_sym = old_sym
+            if len(decl.sym.scope.syms) > 200:
+                self.ctx.report.error(
+                    f"function `{decl.name}` exceeded the maximum number of local variables allowed (200)",
+                    decl.pos
+                )
 
     def check_const_decl(self, decl):
+        # the local constants were registered by `check_stmts`
         if self.first_pass:
-            decl.sym = Const(
-                decl.access_modifier, decl.name, decl.typ, decl.expr,
-                self.cur_scope, isinstance(self.cur_sym, Function), decl.pos
-            )
-            if isinstance(self.cur_sym, Function):
-                decl.is_local = True
-                if decl.access_modifier != AccessModifier.private:
-                    report.error(
-                        "local constants cannot have access modifier", decl.pos
-                    )
-            self.add_sym(decl.sym, decl.pos)
+            self.add_const_decl(decl)
             return
         expr_typ = self.check_expr(decl.expr)
         if decl.typ == None:
             decl.typ = expr_typ
             decl.sym.typ = expr_typ
 
+    def add_const_decl(self, decl):
+        is_local = isinstance(self.cur_sym, Function)
+        decl.typ = self.resolve_type(decl.typ)
+        decl.sym = Const(
+            decl.access_modifier, decl.name, decl.typ, decl.expr,
+            self.cur_scope, is_local, decl.pos
+        )
+        if is_local:
+            decl.is_local = True
+            if decl.access_modifier != AccessModifier.private:
+                self.ctx.report.error(
+                    "local constants cannot have access modifier", decl.pos
+                )
+        self.add_sym(decl.sym, decl.pos)
+
     def check_var_decl(self, stmt):
+        # the local variables were registered by `check_stmts`
         if self.first_pass:
-            for left in stmt.lefts:
-                level = ObjectLevel.static
-                if isinstance(self.cur_sym, Function):
-                    level = ObjectLevel.local
-                    if stmt.access_modifier != AccessModifier.private:
-                        report.error(
-                            "local variables cannot have access modifier",
-                            left.pos
-                        )
-                left.sym = Object(
-                    stmt.access_modifier, left.name, level, left.typ,
-                    self.cur_scope, pos = stmt.pos
-                )
-                self.add_sym(left.sym, left.pos)
-            return
+            self.add_var_decl(stmt)
+
+    def add_var_decl(self, stmt):
+        for left in stmt.lefts:
+            level = ObjectLevel.static
+            if isinstance(self.cur_sym, Function):
+                level = ObjectLevel.local
+                if stmt.access_modifier != AccessModifier.private:
+                    self.ctx.report.error(
+                        "local variables cannot have access modifier", left.pos
+                    )
+            left.typ = self.resolve_type(left.typ)
+            left.sym = Object(
+                stmt.access_modifier, left.name, level, left.typ,
+                self.cur_scope, pos = stmt.pos
+            )
+            self.add_sym(left.sym, left.pos)
 
     ## === Statements ===================================
 
     def check_stmts(self, stmts):
+        # the locals of the block are registered first, so a use above its
+        # declaration finds the local instead of a symbol of the outer scopes,
+        # and `check_symbol` reports it
+        for stmt in stmts:
+            if isinstance(stmt, ConstDecl):
+                self.add_const_decl(stmt)
+            elif isinstance(stmt, VarDecl):
+                self.add_var_decl(stmt)
         for stmt in stmts:
             self.check_stmt(stmt)
 
     def check_stmt(self, stmt):
         if isinstance(stmt, ExprStmt):
             if self.check_expr(stmt.expr) != self.ctx.void_type:
-                report.warn("expression evaluated but not used", stmt.pos)
+                self.ctx.report.warn(
+                    "expression evaluated but not used", stmt.pos
+                )
         elif isinstance(stmt, ConstDecl):
             self.check_const_decl(stmt)
         elif isinstance(stmt, VarDecl):
             self.check_var_decl(stmt)
         elif isinstance(stmt, WhileStmt):
-            if not self.first_pass:
-                if self.check_expr(stmt.cond) != self.ctx.bool_type:
-                    report.error("non-boolean `while` condition", stmt.cond.pos)
+            if self.check_expr(stmt.cond) != self.ctx.bool_type:
+                self.ctx.report.error(
+                    "non-boolean `while` condition", stmt.cond.pos
+                )
             self.check_stmts(stmt.stmts)
 
     ## === Expressions ==================================
 
     def check_expr(self, expr):
-        if self.first_pass and not isinstance(expr, BlockExpr):
-            return self.ctx.void_type
         if isinstance(expr, ParExpr):
             expr.typ = self.check_expr(expr.expr)
         elif isinstance(expr, AssignExpr):
@@ -229,7 +263,7 @@ class Sema:
                 if isinstance(sym, (Object, Const)):
                     expr.typ = sym.typ
                 else:
-                    report.error(
+                    self.ctx.report.error(
                         f"expected value, found {sym.kind_of()} `{sym.name}`",
                         expr.pos
                     )
@@ -240,36 +274,31 @@ class Sema:
                 if isinstance(expr.sym, (Object, Const)):
                     expr.typ = expr.sym.typ
                 else:
-                    report.error(
+                    self.ctx.report.error(
                         f"expected value, found {expr.sym.kind_of()} `{expr.sym.name}`",
                         expr.pos
                     )
         elif isinstance(expr, BlockExpr):
-            if self.first_pass:
-                expr.scope = self.open_scope()
-                self.check_stmts(expr.stmts)
-                return self.ctx.void_type
-            old_scope = self.cur_scope
-            self.cur_scope = expr.scope
+            expr.scope = self.open_scope()
             self.check_stmts(expr.stmts)
-            self.cur_scope = old_scope
             if expr.expr != None:
                 expr.typ = self.check_expr(expr.expr)
             else:
                 expr.typ = self.ctx.void_type
+            self.close_scope()
         elif isinstance(expr, UnaryExpr):
             right_t = self.check_expr(expr.right)
             match expr.op:
                 case UnaryOp.bang:
                     if right_t != self.ctx.bool_type:
-                        report.error(
+                        self.ctx.report.error(
                             f"operator `!` is not defined for type `{right_t}`",
                             expr.pos,
                             ["operator `!` is only defined for type `bool`"]
                         )
                 case UnaryOp.minus:
-                    if right_t not in (self.ctx.int_type, self.ctx.float_type):
-                        report.error(
+                    if not (right_t and right_t.is_numeric):
+                        self.ctx.report.error(
                             f"operator `-` is not defined for type `{right_t}`",
                             expr.pos, [
                                 "operator `-` is only defined for `int` and `float` types"
@@ -277,7 +306,7 @@ class Sema:
                         )
                 case UnaryOp.bit_not:
                     if right_t != self.ctx.int_type:
-                        report.error(
+                        self.ctx.report.error(
                             f"operator `~` is not defined for type `{right_t}`",
                             expr.pos,
                             ["operator `~` is only defined for type `int`"]
@@ -291,7 +320,7 @@ class Sema:
                         left_t == self.ctx.bool_type
                         and right_t == self.ctx.bool_type
                     ):
-                        report.error(
+                        self.ctx.report.error(
                             f"operator `{expr.op}` is not defined for type `{right_t}`",
                             expr.pos, [
                                 f"operator `{expr.op}` is only defined for type `bool`"
@@ -307,7 +336,9 @@ class Sema:
                 if (not branch.is_else) and self.check_expr(
                     branch.cond
                 ) != self.ctx.bool_type:
-                    report.error("non-boolean `if` condition", branch.cond.pos)
+                    self.ctx.report.error(
+                        "non-boolean `if` condition", branch.cond.pos
+                    )
                 branch_t = self.check_expr(branch.expr)
                 if i == 0:
                     expr.typ = branch_t
@@ -321,7 +352,7 @@ class Sema:
         elif isinstance(expr.left, PathExpr):
             expr.left_sym = self.check_path_expr(expr.left)
         else:
-            report.error(
+            self.ctx.report.error(
                 "invalid expression on left side of path", expr.left.pos
             )
 
@@ -331,15 +362,16 @@ class Sema:
         if path_sym := expr.left_sym.scope.find(expr.name):
             expr.sym = path_sym
             if not self.cur_sym.has_access_to(path_sym):
-                report.error(
+                self.ctx.report.error(
                     f"cannot access private {path_sym.kind_of()} `{path_sym.name}`",
                     expr.pos
                 )
         else:
-            report.error(
+            self.ctx.report.error(
                 f"{expr.left_sym.kind_of()} `{expr.left_sym}` does not contain a symbol named `{expr.name}`",
                 expr.pos
             )
+        return expr.sym
 
     ## === Symbols ======================================
 
@@ -352,21 +384,79 @@ class Sema:
         elif module_sym := self.cur_mod.scope.find(name):
             ret_sym = module_sym
         else:
-            report.error(f"cannot find symbol `{name}` in this scope", pos)
-        if ret_sym != None and ret_sym.pos != None and ret_sym.pos.line > pos.line:
-            report.error(
+            self.ctx.report.error(
+                f"cannot find symbol `{name}` in this scope", pos
+            )
+        if ret_sym != None and (decl_pos := ret_sym.pos) != None and (
+            decl_pos.file_id == pos.file_id and decl_pos.start > pos.start
+        ):
+            self.ctx.report.error(
                 f"{ret_sym.kind_of()} `{ret_sym.name}` is used before its declaration",
                 pos
             )
         return ret_sym
 
+    ## === Types ========================================
+
+    def resolve_type(self, typ):
+        # returns the interned version of a type written in the source; types
+        # that name something Sema does not know yet (records, `Self`) are
+        # returned as written
+        if typ == None or typ.is_interned:
+            return typ
+        types = self.ctx.types
+        if isinstance(typ, BasicType):
+            if typesym := self.find_typesym(typ.expr):
+                return types.basic(typesym)
+        elif isinstance(typ, ResultType):
+            if (inner := self.resolve_type(typ.type)).is_interned:
+                return types.result(inner)
+        elif isinstance(typ, OptionType):
+            if (inner := self.resolve_type(typ.type)).is_interned:
+                return types.option(inner)
+        elif isinstance(typ, ArrayType):
+            if (inner := self.resolve_type(typ.type)).is_interned:
+                return types.array(typ.size, inner)
+        elif isinstance(typ, TableType):
+            k_type = self.resolve_type(typ.k_type)
+            v_type = self.resolve_type(typ.v_type)
+            if k_type.is_interned and v_type.is_interned:
+                return types.table(k_type, v_type)
+        elif isinstance(typ, (SumType, TupleType)):
+            members = [self.resolve_type(t) for t in typ.types]
+            if all(t.is_interned for t in members):
+                if isinstance(typ, SumType):
+                    return types.sum(members)
+                return types.tuple(members)
+        return typ
+
+    def find_typesym(self, expr):
+        sym = self.find_sym(expr)
+        return sym if isinstance(sym, TypeSym) else None
+
+    def find_sym(self, expr):
+        # like `check_symbol` and `check_path_expr`, but without reporting
+        # errors, the builtin types are also found in the universe
+        if isinstance(expr, Ident):
+            if sym := self.cur_scope.lookup(expr.name):
+                return sym
+            if sym := self.cur_sym.scope.find(expr.name):
+                return sym
+            if sym := self.cur_mod.scope.find(expr.name):
+                return sym
+            return self.ctx.universe.find(expr.name)
+        elif isinstance(expr, PathExpr):
+            if left_sym := self.find_sym(expr.left):
+                return left_sym.scope.find(expr.name)
+        return None
+
     ## === Utilities ====================================
 
     def add_sym(self, sym, pos):
         try:
             self.cur_sym.scope.add_sym(sym)
         except utils.CompilerError as e:
-            report.error_from_ce(e, pos)
+            self.ctx.report.error_from_ce(e, pos)
 
     def open_scope(self, detach_from_parent = False):
         self.cur_scope = Scope(self.cur_scope, detach_from_parent)
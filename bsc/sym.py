@@ -39,30 +39,54 @@ class AccessModifier(IntEnum):
 
 class Sym:
     def __init__(self, access_modifier, name, pos = None):
-        self.parent = None
+        self._parent = None
         self.access_modifier = access_modifier
         self.name = name
         self.pos = pos
+        # the results of `qualname`, `get_pkg` and `get_mod`, they depend on
+        # the parents of the symbol so they are dropped when it (or one of its
+        # parents) is moved to another parent
+        self.cache = {}
+
+    @property
+    def parent(self):
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        if parent is not self._parent:
+            self._parent = parent
+            self.clear_cache()
+
+    def clear_cache(self):
+        # a child can only have cached something that depends on its parents
+        # if its parent has cached it too, so the walk stops at the first
+        # symbol without a cache
+        if self.cache:
+            self.cache = {}
+            if (scope := getattr(self, "scope", None)) and scope.owner is self:
+                for sym in scope.syms:
+                    sym.clear_cache()
 
     def get_pkg(self):
-        s = self
-        while True:
-            if isinstance(s, Module) and s.is_pkg:
-                return s
-            if s.parent == None:
-                break
-            s = s.parent
-        return None
+        if "pkg" not in self.cache:
+            if isinstance(self, Module) and self.is_pkg:
+                self.cache["pkg"] = self
+            elif self.parent:
+                self.cache["pkg"] = self.parent.get_pkg()
+            else:
+                self.cache["pkg"] = None
+        return self.cache["pkg"]
 
     def get_mod(self):
-        s = self
-        while True:
-            if isinstance(s, Module):
-                return s
-            if s.parent == None:
-                break
-            s = s.parent
-        return None
+        if "mod" not in self.cache:
+            if isinstance(self, Module):
+                self.cache["mod"] = self
+            elif self.parent:
+                self.cache["mod"] = self.parent.get_mod()
+            else:
+                self.cache["mod"] = None
+        return self.cache["mod"]
 
     def has_access_to(self, other):
         match other.access_modifier:
@@ -92,12 +116,16 @@ class Sym:
         return "symbol"
 
     def qualname(self, sep = "::"):
-        if self.parent and not self.parent.scope.is_universe:
-            return f"{self.parent.qualname(sep)}{sep}{self.name}"
-        return self.name
+        if (qualname := self.cache.get(sep)) == None:
+            if self.parent and not self.parent.scope.is_universe:
+                qualname = f"{self.parent.qualname(sep)}{sep}{self.name}"
+            else:
+                qualname = self.name
+            self.cache[sep] = qualname
+        return qualname
 
-    def __eq__(self, other):
-        return str(self) == str(other)
+    # symbols are compared (and hashed) by identity: each declaration has a
+    # single `Sym`, and the builtin types are shared through the context
 
     def __repr__(self):
         return str(self)
@@ -249,16 +277,15 @@ class Scope:
         ), f"parent is {parent}"
         self.parent = parent
         self.owner = None
+        # `syms` keeps the declaration order, `names` indexes it by name
         self.syms = []
+        self.names = {}
         self.children = []
         self.detached_from_parent = detach_from_parent
         self.is_universe = is_universe
 
     def find(self, name):
-        for sym in self.syms:
-            if sym.name == name:
-                return sym
-        return None
+        return self.names.get(name)
 
     def lookup(self, name):
         sc = self
@@ -291,3 +318,4 @@ class Scope:
             raise CompilerError(errmsg, note)
         sym.parent = self.owner
         self.syms.append(sym)
+        self.names[sym.name] = sym
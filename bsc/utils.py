@@ -3,6 +3,7 @@
 # LICENSE file.
 
 from io import StringIO
+from collections import deque
 import os, sys, subprocess
 
 VERSION = "0.1.0a"
@@ -25,8 +26,17 @@ def can_show_color_on_stdout():
 def can_show_color_on_stderr():
     return supports_escape_sequences(2)
 
+# set by the daemon according to the terminal of each client, `None` means
+# that the terminal of this process is checked
+show_colors = None
+
+def can_show_colors():
+    if show_colors != None:
+        return show_colors
+    return can_show_color_on_stdout() and can_show_color_on_stderr()
+
 def format(msg, open, close):
-    if not (can_show_color_on_stdout() and can_show_color_on_stderr()):
+    if not can_show_colors():
         return msg
     return f"\x1b[{open}m{msg}\x1b[{close}m"
 
@@ -54,9 +64,24 @@ def red(msg):
 def commit_hash():
     return execute("git", "log", "-n", "1", '--pretty=format:%h').out
 
+full_version_ = ""
+
 def full_version():
-    commit_date = execute("git", "log", "-n", "1", '--pretty=format:%h %as').out
-    return f"bsc {VERSION} ({commit_date})"
+    # asks git once per process, and about the checkout of the compiler, not
+    # about the one the compiler is run from
+    global full_version_
+    if full_version_ == "":
+        full_version_ = f"bsc {VERSION}"
+        try:
+            res = execute(
+                "git", "-C", os.path.dirname(os.path.abspath(__file__)), "log",
+                "-n", "1", '--pretty=format:%h %as'
+            )
+            if res.exit_code == 0 and res.out != "":
+                full_version_ += f" ({res.out})"
+        except OSError:
+            pass # git is not installed
+    return full_version_
 
 class ProcessResult:
     def __init__(self, out, err, exit_code):
@@ -143,83 +168,11 @@ def escape_nonascii(original):
             sb.write(chr(c))
     return str(sb)
 
-class OrderedDepMap:
-    def __init__(self, keys = [], data = {}):
-        self.keys = keys.copy()
-        self.data = data.copy()
-
-    def set(self, name, deps):
-        if name not in self.data:
-            self.keys.append(name)
-        self.data[name] = deps
-
-    def add(self, name, deps):
-        d = self.get(name)
-        for dep in deps:
-            if dep not in d:
-                d.append(dep)
-        self.set(name, d)
-
-    def get(self, name):
-        return self.data[name] if name in self.data else []
-
-    def delete(self, name):
-        if name not in self.data:
-            raise KeyError(f"OrderedDepMap.delete: no such key `{name}`")
-        for i, _ in enumerate(self.keys):
-            if self.keys[i] == name:
-                self.keys.pop(i)
-                break
-        self.data.pop(name)
-
-    def apply_diff(self, name, deps):
-        diff = []
-        deps_of_name = self.get(name)
-        for dep in deps_of_name:
-            if dep not in deps:
-                diff.append(dep)
-        self.set(name, diff)
-
-    def size(self):
-        return len(self.data)
-
 class DepGraphNode:
     def __init__(self, name, deps):
         self.name = name
         self.deps = deps
 
-class NodeNames:
-    def __init__(self, is_cycle = {}, names = {}):
-        self.is_cycle = is_cycle.copy()
-        self.names = names.copy()
-
-    def is_part_of_cycle(self, name, already_seen):
-        seen = False
-        new_already_seen = already_seen.copy()
-        if name in self.is_cycle:
-            return self.is_cycle[name], new_already_seen
-
-        if name in already_seen:
-            new_already_seen.append(name)
-            self.is_cycle[name] = True
-            return True, new_already_seen
-
-        new_already_seen.append(name)
-        deps = self.names[name] if name in self.names else []
-        if len(deps) == 0:
-            self.is_cycle[name] = False
-            return False, new_already_seen
-
-        for d in deps:
-            d_already_seen = new_already_seen.copy()
-            seen, d_already_seen = self.is_part_of_cycle(d, d_already_seen)
-            if seen:
-                new_already_seen = d_already_seen.copy()
-                self.is_cycle[name] = True
-                return True, new_already_seen
-        self.is_cycle[name] = False
-        return False, new_already_seen
-
 class DepGraph:
     def __init__(self, acyclic = True, nodes = []):
         self.acyclic = acyclic
@@ -229,30 +182,45 @@ class DepGraph:
         self.nodes.append(DepGraphNode(name, deps))
 
     def resolve(self):
-        node_names = OrderedDepMap()
-        node_deps = OrderedDepMap()
+        # Kahn's algorithm, by rounds: each round takes the nodes whose
+        # dependencies were all taken by the previous rounds, in the order
+        # they were added. The nodes left when no node is ready are part of
+        # (or depend on) a cycle, or depend on a node that does not exist.
+        order = {}
+        node_deps = {}
         for node in self.nodes:
-            node_names.add(node.name, node.deps)
-            node_deps.add(node.name, node.deps)
-        iterations = 0
+            if node.name not in node_deps:
+                order[node.name] = len(order)
+                node_deps[node.name] = []
+            deps = node_deps[node.name]
+            for dep in node.deps:
+                if dep not in deps:
+                    deps.append(dep)
+        pending = {}
+        dependents = {}
+        for name, deps in node_deps.items():
+            pending[name] = len(deps)
+            for dep in deps:
+                dependents.setdefault(dep, []).append(name)
         resolved = DepGraph()
-        while node_deps.size() != 0:
-            iterations += 1
-            ready_set = []
-            for name in node_deps.keys:
-                if len(node_deps.get(name)) == 0:
-                    ready_set.append(name)
-            if len(ready_set) == 0:
-                g = DepGraph()
-                g.acyclic = False
-                for name in node_deps.keys:
-                    g.add(name, node_names.get(name))
-                return g
-            for name in ready_set:
-                node_deps.delete(name)
-                resolved.add(name, node_names.get(name))
-            for name in node_deps.keys:
-                node_deps.apply_diff(name, ready_set)
+        ready = [name for name, count in pending.items() if count == 0]
+        while len(ready) > 0:
+            next_ready = []
+            for name in ready:
+                resolved.add(name, node_deps[name])
+                for dependent in dependents.get(name, []):
+                    pending[dependent] -= 1
+                    if pending[dependent] == 0:
+                        next_ready.append(dependent)
+            next_ready.sort(key = order.__getitem__)
+            ready = next_ready
+        if len(resolved.nodes) < len(node_deps):
+            g = DepGraph()
+            g.acyclic = False
+            for name, deps in node_deps.items():
+                if pending[name] > 0:
+                    g.add(name, deps)
+            return g
         return resolved
 
     def last_node(self):
@@ -266,16 +234,90 @@ class DepGraph:
         return "\n".join(out)
 
     def display_cycles(self):
-        seen = False
         out = []
-        nn = NodeNames()
+        for scc in self.strongly_connected_components():
+            out.append(" > " + " -> ".join(self.cycle_in(scc)))
+        return "\n".join(out)
+
+    def strongly_connected_components(self):
+        # Tarjan's algorithm, with an explicit stack instead of recursion so
+        # long chains of modules do not hit the recursion limit. Returns the
+        # components that contain a cycle (more than one node, or a node that
+        # depends on itself), in the order their first node was added; the
+        # nodes of each component are in the order they were added too.
+        order = {}
+        node_deps = {}
         for node in self.nodes:
-            nn.names[node.name] = node.deps
-        for k, _ in nn.names.items():
-            cycle_names = []
-            if k in nn.is_cycle:
+            if node.name not in order:
+                order[node.name] = len(order)
+                node_deps[node.name] = []
+            node_deps[node.name] += node.deps
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        sccs = []
+        for root in node_deps:
+            if root in index:
                 continue
-            seen, cycle_names = nn.is_part_of_cycle(k, cycle_names)
-            if seen:
-                out.append(" > " + " -> ".join(cycle_names))
-        return "\n".join(out)
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(node_deps[root]))]
+            while len(work) > 0:
+                name, deps = work[-1]
+                for dep in deps:
+                    if dep not in node_deps:
+                        continue # not part of the graph
+                    if dep not in index:
+                        index[dep] = lowlink[dep] = len(index)
+                        stack.append(dep)
+                        on_stack.add(dep)
+                        work.append((dep, iter(node_deps[dep])))
+                        break
+                    if dep in on_stack:
+                        lowlink[name] = min(lowlink[name], index[dep])
+                else:
+                    work.pop()
+                    if len(work) > 0:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[name])
+                    if lowlink[name] == index[name]:
+                        scc = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            scc.append(member)
+                            if member == name:
+                                break
+                        if len(scc) > 1 or name in node_deps[name]:
+                            sccs.append(sorted(scc, key = order.__getitem__))
+        sccs.sort(key = lambda scc: order[scc[0]])
+        return sccs
+
+    def cycle_in(self, scc):
+        # the shortest path from the first node of the component back to
+        # itself, through the nodes of the component
+        members = set(scc)
+        node_deps = {}
+        for node in self.nodes:
+            if node.name in members:
+                node_deps.setdefault(node.name, []).extend(node.deps)
+        start = scc[0]
+        came_from = {}
+        queue = deque([start])
+        while len(queue) > 0:
+            name = queue.popleft()
+            for dep in node_deps[name]:
+                if dep == start:
+                    path = [start]
+                    while name != start:
+                        path.append(name)
+                        name = came_from[name]
+                    path.append(start)
+                    path.reverse()
+                    return path
+                if dep in members and dep not in came_from:
+                    came_from[dep] = name
+                    queue.append(dep)
+        assert False # unreachable, `scc` has a cycle
@@ -0,0 +1,70 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import os
+
+from harness import write_file, in_package, run_cases
+from bsc import Context
+from bsc.utils import BSC_OUT_DIR
+
+PACKAGE = {
+    "main.bs": "mod b;\nfn main() {}\n",
+    "b.bs": "pub fn f() {\n    const x = 1;\n}\n"
+}
+
+ctx = Context(echo_diagnostics = False)
+cache = ctx.astgen.ast_cache
+
+def build(*args, input = os.path.join("src", "main.bs")):
+    # returns the files loaded from the cache and the ones parsed again
+    cache.hits, cache.misses = 0, 0
+    ctx.recompile(["--no-incremental", *args, input])
+    return cache.hits, cache.misses
+
+def read_output(name):
+    with open(os.path.join(BSC_OUT_DIR, f"{name}.lua")) as f:
+        return f.read()
+
+def check_unchanged_files():
+    errors = []
+    if (counts := build()) != (0, 2):
+        errors.append(f"the first build loaded and parsed {counts} files")
+    if (counts := build()) != (2, 0):
+        errors.append(f"an unchanged package loaded and parsed {counts} files")
+    if "local x = 1" not in read_output("b"):
+        errors.append("`bsc-out/b.lua` was not generated from the cache")
+    return errors
+
+def check_changed_file():
+    build()
+    write_file("b.bs", "pub fn f() {\n    const x = 2;\n}\n")
+    errors = []
+    if (counts := build()) != (1, 1):
+        errors.append(f"editing `b` loaded and parsed {counts} files")
+    if "local x = 2" not in read_output("b"):
+        errors.append("`bsc-out/b.lua` was generated from the old AST")
+    return errors
+
+def check_path_spelling():
+    # the diagnostics of a file loaded from the cache use the path it was
+    # given with in this compilation, not in the one that stored it; only the
+    # input is not found through the path of another module
+    write_file("main.bs", "mod b;\nfn main() {\n    const x = y;\n}\n")
+    build("--check", input = os.path.join(".", "src", "main.bs"))
+    errors = []
+    if (counts := build("--check")) != (2, 0):
+        errors.append(f"the second build loaded and parsed {counts} files")
+    files = [diagnostic.pos.file for diagnostic in ctx.report.diagnostics]
+    if files != [os.path.join("src", "main.bs")]:
+        errors.append(f"the diagnostics point to {files}")
+    return errors
+
+CASES = [("unchanged files", check_unchanged_files),
+         ("a changed file", check_changed_file),
+         ("the spelling of a path", check_path_spelling)]
+
+if __name__ == "__main__":
+    # each case builds the same package in its own directory, and checks
+    # which files are loaded from the AST cache
+    run_cases(CASES, lambda check: in_package(PACKAGE, check))
@@ -0,0 +1,93 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import os, sys, time, socket, tempfile, subprocess
+
+from harness import BSC_DIR, run_cases
+
+START_TIMEOUT = 30 # seconds
+
+tmp_dir = tempfile.TemporaryDirectory()
+# read by `bsc.daemon` when it is imported, and inherited by the daemons
+os.environ["BSC_DAEMON_SOCKET"] = os.path.join(tmp_dir.name, "bsc.sock")
+
+from bsc import utils, daemon
+
+def start_daemon():
+    return subprocess.Popen([sys.executable, BSC_DIR, "daemon"],
+                            stdout = subprocess.DEVNULL,
+                            stderr = subprocess.DEVNULL)
+
+def wait_for_daemon(process):
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline and process.poll() == None:
+        if daemon.is_daemon_running():
+            return True
+        time.sleep(0.05)
+    return False
+
+def compile_request(*args):
+    return daemon.request({
+        "cwd": os.path.dirname(BSC_DIR),
+        "argv": ["--check", "--no-cache", *args],
+        "colors": False
+    })
+
+def check_compile():
+    errors = []
+    response = compile_request("tests/main.bs")
+    if response["exit_code"] != 0 or response["err"] != "":
+        errors.append(f"compiling `tests/main.bs` replied {response}")
+    response = compile_request("tests/invalid_code/while_stmt.bs")
+    if response["exit_code"] != 1 or "error:" not in response["err"]:
+        errors.append(f"compiling invalid code replied {response}")
+    return errors
+
+def check_second_daemon():
+    # the running daemon must keep its socket
+    second = start_daemon()
+    if second.wait(START_TIMEOUT) == 0:
+        return ["a second daemon was started"]
+    if not daemon.is_daemon_running():
+        return ["the running daemon lost its socket"]
+    return []
+
+def check_stale_socket():
+    # a daemon that was killed leaves its socket file behind
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(daemon.SOCKET_FILE)
+    process = start_daemon()
+    try:
+        if not wait_for_daemon(process):
+            return ["the daemon did not replace a stale socket"]
+        daemon.request({ "stop": True })
+        process.wait(START_TIMEOUT)
+    finally:
+        if process.poll() == None:
+            process.kill()
+    return []
+
+def check_stop():
+    daemon.request({ "stop": True })
+    if process.wait(START_TIMEOUT) != 0 or os.path.exists(daemon.SOCKET_FILE):
+        return ["it did not stop cleanly"]
+    return []
+
+CASES = [("a compilation request", check_compile),
+         ("starting a second daemon", check_second_daemon),
+         ("stopping the daemon", check_stop),
+         ("a stale socket", check_stale_socket)]
+
+if __name__ == "__main__":
+    # the cases talk to a daemon started in another process through the
+    # same protocol as `bsc client`
+    process = start_daemon()
+    try:
+        if not wait_for_daemon(process):
+            utils.error("the daemon did not start")
+        run_cases(CASES)
+    finally:
+        if process.poll() == None:
+            process.kill()
+        tmp_dir.cleanup()
@@ -0,0 +1,182 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import random
+
+from harness import run_cases
+from bsc import utils
+
+RANDOM_GRAPHS = 2000
+RANDOM_SCC_GRAPHS = 20000
+LONG_CHAIN = 5000
+
+def dep_graph(edges):
+    g = utils.DepGraph()
+    for name, deps in edges:
+        g.add(name, deps)
+    return g
+
+def random_edges(rand, max_size = 8):
+    # a few nodes with random dependencies, some of them repeated, on
+    # themselves or on nodes that are not part of the graph
+    size = rand.randrange(1, max_size + 1)
+    names = [f"m{i}" for i in range(size)]
+    edges = []
+    for name in names:
+        deps = [
+            rand.choice(names + ["missing"])
+            for _ in range(rand.randrange(0, 4))
+        ]
+        edges.append((name, deps))
+    if rand.random() < 0.3:
+        edges.append((rand.choice(names), [rand.choice(names)]))
+    return edges
+
+def reference_resolve(edges):
+    # the algorithm used before Kahn's: each round takes every node without
+    # pending dependencies, in the order they were added
+    remaining = {}
+    for name, deps in edges:
+        node_deps = remaining.setdefault(name, [])
+        for dep in deps:
+            if dep not in node_deps:
+                node_deps.append(dep)
+    all_deps = { name: deps.copy() for name, deps in remaining.items() }
+    resolved = []
+    while len(remaining) > 0:
+        ready = [name for name, deps in remaining.items() if len(deps) == 0]
+        if len(ready) == 0:
+            return False, [(name, all_deps[name]) for name in remaining]
+        for name in ready:
+            del remaining[name]
+            resolved.append((name, all_deps[name]))
+        for name, deps in remaining.items():
+            remaining[name] = [dep for dep in deps if dep not in ready]
+    return True, resolved
+
+def check_resolve_order():
+    g = dep_graph([("main", ["a", "b"]), ("a", ["c"]), ("b", ["c"]), ("c", []),
+                   ("d", ["a"])])
+    resolved = g.resolve()
+    names = [node.name for node in resolved.nodes]
+    if not resolved.acyclic or names != ["c", "a", "b", "main", "d"]:
+        return [f"resolved as {names}"]
+    return []
+
+def check_resolve_cycles():
+    g = dep_graph([("main", ["a", "e"]), ("a", ["b"]), ("b", ["c"]),
+                   ("c", ["a"]), ("d", []), ("e", ["e"])])
+    resolved = g.resolve()
+    errors = []
+    if resolved.acyclic:
+        errors.append("the graph was resolved")
+    cycles = resolved.display_cycles()
+    if cycles != " > a -> b -> c -> a\n > e -> e":
+        errors.append(f"the cycles are displayed as:\n{cycles}")
+    return errors
+
+def check_random_graphs():
+    # `resolve` must order the nodes exactly like the previous algorithm
+    rand = random.Random(0)
+    for _ in range(RANDOM_GRAPHS):
+        edges = random_edges(rand)
+        resolved = dep_graph(edges).resolve()
+        acyclic, nodes = reference_resolve(edges)
+        got = [(node.name, node.deps) for node in resolved.nodes]
+        if resolved.acyclic != acyclic or got != nodes:
+            return [f"{edges} resolved as {got}, expected {nodes}"]
+    return []
+
+def reachable(node_deps, name):
+    # the nodes that can be reached from `name` through one or more edges
+    seen = set()
+    pending = list(node_deps[name])
+    while len(pending) > 0:
+        dep = pending.pop()
+        if dep in node_deps and dep not in seen:
+            seen.add(dep)
+            pending += node_deps[dep]
+    return seen
+
+def reference_sccs(edges):
+    # a node is part of a cycle if it can reach itself, and its component
+    # are the nodes it can reach that can reach it back
+    node_deps = {}
+    for name, deps in edges:
+        node_deps.setdefault(name, []).extend(deps)
+    reach = { name: reachable(node_deps, name) for name in node_deps }
+    sccs = []
+    seen = set()
+    for name in node_deps:
+        if name in reach[name] and name not in seen:
+            scc = [
+                other for other in node_deps
+                if other in reach[name] and name in reach[other]
+            ]
+            seen.update(scc)
+            sccs.append(scc)
+    return node_deps, sccs
+
+def shortest_cycle(node_deps, scc):
+    # the length of the shortest cycle from the first node of `scc`, by
+    # checking every path of increasing length
+    paths = [[scc[0]]]
+    while True:
+        next_paths = []
+        for path in paths:
+            for dep in node_deps[path[-1]]:
+                if dep == scc[0]:
+                    return len(path)
+                if dep in scc and dep not in path:
+                    next_paths.append(path + [dep])
+        paths = next_paths
+
+def check_cycle(node_deps, scc, cycle):
+    if cycle[0] != scc[0] or cycle[-1] != scc[0]:
+        return f"the cycle {cycle} does not start and end at `{scc[0]}`"
+    for name, dep in zip(cycle, cycle[1:]):
+        if name not in scc or dep not in node_deps[name]:
+            return f"the cycle {cycle} is not part of {scc}"
+    if len(cycle) - 1 != shortest_cycle(node_deps, scc):
+        return f"the cycle {cycle} is not the shortest one of {scc}"
+    return None
+
+def check_random_sccs():
+    # the components found by Tarjan's algorithm must be the ones found by
+    # brute force, and each displayed cycle must be a shortest cycle
+    rand = random.Random(1)
+    for _ in range(RANDOM_SCC_GRAPHS):
+        edges = random_edges(rand, 12)
+        g = dep_graph(edges)
+        node_deps, expected = reference_sccs(edges)
+        sccs = g.strongly_connected_components()
+        if sccs != expected:
+            return [f"{edges} has the components {sccs}, expected {expected}"]
+        cycles = []
+        for scc in sccs:
+            cycle = g.cycle_in(scc)
+            if error := check_cycle(node_deps, scc, cycle):
+                return [f"{edges}: {error}"]
+            cycles.append(" > " + " -> ".join(cycle))
+        if len(sccs) > 0 and g.display_cycles() != "\n".join(cycles):
+            return [f"{edges} displays the cycles as:\n{g.display_cycles()}"]
+    return []
+
+def check_long_chain():
+    # deeper than the recursion limit
+    names = [f"m{i}" for i in range(LONG_CHAIN)]
+    edges = [(name, [dep]) for name, dep in zip(names, names[1:] + names[:1])]
+    sccs = dep_graph(edges).strongly_connected_components()
+    if sccs != [names]:
+        return [f"the chain has {len(sccs)} components"]
+    return []
+
+CASES = [("the order of the resolved nodes", check_resolve_order),
+         ("the cycles of the unresolved nodes", check_resolve_cycles),
+         ("random graphs", check_random_graphs),
+         ("the components of random graphs", check_random_sccs),
+         ("a long cycle", check_long_chain)]
+
+if __name__ == "__main__":
+    run_cases(CASES)
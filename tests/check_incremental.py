@@ -0,0 +1,86 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import os
+
+from harness import write_file, in_package, run_cases
+from bsc import Context
+from bsc.utils import BSC_OUT_DIR
+
+# `main` imports `a`, `b` and `c`, and `a` imports `d`
+PACKAGE = {
+    "main.bs": "mod a;\nmod b;\nmod c;\nfn main() {}\n",
+    "a.bs": "mod d;\npub fn h() {}\n",
+    "b.bs": "pub fn f() {\n    const x = 1;\n}\n",
+    "c.bs": "pub fn g() {}\n",
+    "d.bs": "pub fn k() {}\n"
+}
+
+ctx = Context(echo_diagnostics = False)
+
+def build(*args):
+    # returns the modules that were generated, or the diagnostics if the
+    # build failed
+    res = ctx.recompile([*args, os.path.join("src", "main.bs")])
+    if not res.succeeded():
+        return [str(diagnostic) for diagnostic in res.diagnostics]
+    return [module.name for module in ctx.codegen.modules]
+
+def read_output(name):
+    with open(os.path.join(BSC_OUT_DIR, f"{name}.lua")) as f:
+        return f.read()
+
+def check_edited_leaf():
+    build()
+    errors = []
+    if (modules := build()) != []:
+        errors.append(f"an unchanged package generated {modules}")
+    write_file("d.bs", "pub fn k() {\n    const y = 2;\n}\n")
+    if (modules := build()) != ["d"]:
+        errors.append(f"editing the body of `d` generated {modules}")
+    return errors
+
+def check_interface_change():
+    build()
+    # `a` and `main` import `d`, directly or not, so they must be checked
+    # again against its new interface
+    write_file("d.bs", "pub fn k() {}\npub fn k2() {}\n")
+    if (modules := build()) != ["d", "a", "main"]:
+        return [f"changing the interface of `d` generated {modules}"]
+    return []
+
+def check_non_incremental_build():
+    build()
+    write_file("b.bs", "pub fn f() {\n    const x = 2;\n}\n")
+    build("--no-incremental")
+    # the last build must compare `b` with the one generated by
+    # `--no-incremental`, not with the one of the first build
+    write_file("b.bs", PACKAGE["b.bs"])
+    errors = []
+    if (modules := build()) != ["b"]:
+        errors.append(f"reverting `b` generated {modules}")
+    if "local x = 1" not in read_output("b"):
+        errors.append("`bsc-out/b.lua` was not generated again")
+    return errors
+
+def check_bundle():
+    all_modules = build("--bundle")
+    # the bundle contains every module, so they are all checked again
+    write_file("main.bs", PACKAGE["main.bs"] + "fn other() {}\n")
+    errors = []
+    if (modules := build("--bundle")) != all_modules:
+        errors.append(f"editing `main` generated {modules}")
+    elif "local x = 1" not in read_output("main"):
+        errors.append("the bundle does not contain the code of `b`")
+    return errors
+
+CASES = [("an edited leaf module", check_edited_leaf),
+         ("an interface change", check_interface_change),
+         ("a build with `--no-incremental`", check_non_incremental_build),
+         ("a bundle with an edited module", check_bundle)]
+
+if __name__ == "__main__":
+    # each case builds the same package in its own directory, changes it and
+    # checks which modules the incremental build generates again
+    run_cases(CASES, lambda check: in_package(PACKAGE, check))
@@ -2,40 +2,81 @@
 # source code is governed by an MIT license that can be found in the
 # LICENSE file.
 
-import os, sys, glob
+import os, sys, glob, time, argparse
+from concurrent.futures import ProcessPoolExecutor
 
 BSC_DIR = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bsc"
 )
 sys.path.append(os.path.dirname(BSC_DIR))
 
-from bsc import utils
+from bsc import Context, utils
 
-ok, fail = 0, 0
+# one compiler per process (the main one or a worker of `-j`), its state is
+# reset for each case so only its parsers are shared between the cases
+ctx = None
 
-bs_files = glob.glob("tests/invalid_code/*.bs")
-for i, bs_file in enumerate(bs_files):
-    out_file = bs_file[:-3] + ".out"
-    print(f"  [{i+1}/{len(bs_files)}] {utils.bold(bs_file)}", end = "")
-    res = utils.execute(f"python3", "bsc", "--check", bs_file)
-    if res.exit_code == 0:
-        print(utils.bold(utils.red(" -> FAILED")))
-        fail += 1
-    else:
-        out_content = open(out_file).read().strip()
-        if out_content == res.err:
-            print(utils.bold(utils.green(" -> PASSED")))
-            ok += 1
-        else:
-            print(utils.bold(utils.red(" -> FAILED")))
-            print("Expected:")
-            print(out_content)
-            print("\nGot:")
-            print(res.err)
+def check_file(bs_file):
+    global ctx
+    start = time.perf_counter()
+    if ctx == None:
+        ctx = Context(echo_diagnostics = False)
+    # the AST cache is not used, so the cases never write to the working tree
+    res = ctx.recompile(["--check", "--no-cache", bs_file])
+    elapsed = time.perf_counter() - start
+    utils.show_colors = False # the expected output has no colors
+    err = "\n".join([str(diagnostic) for diagnostic in res.diagnostics])
+    utils.show_colors = None
+    return res.exit_code, err, elapsed
+
+def check_files(bs_files, results):
+    ok, fail = 0, 0
+    for i, (bs_file, result) in enumerate(zip(bs_files, results)):
+        exit_code, err, elapsed = result
+        out_file = bs_file[:-3] + ".out"
+        timing = f" ({elapsed * 1000:.1f} ms)"
+        print(f"  [{i+1}/{len(bs_files)}] {utils.bold(bs_file)}", end = "")
+        if exit_code == 0:
+            print(utils.bold(utils.red(" -> FAILED")) + timing)
             fail += 1
+        else:
+            out_content = open(out_file).read().strip()
+            if out_content == err:
+                print(utils.bold(utils.green(" -> PASSED")) + timing)
+                ok += 1
+            else:
+                print(utils.bold(utils.red(" -> FAILED")) + timing)
+                print("Expected:")
+                print(out_content)
+                print("\nGot:")
+                print(err)
+                fail += 1
+    return ok, fail
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description =
+        'Checks that the compiler rejects each file of `tests/invalid_code` with the expected diagnostics'
+    )
+    parser.add_argument(
+        '-j', '--jobs', action = 'store', type = int, default = 1,
+        metavar = 'N',
+        help = 'number of processes used to run the cases (0 uses one per CPU)'
+    )
+    args = parser.parse_args()
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+    start = time.perf_counter()
+    bs_files = sorted(glob.glob("tests/invalid_code/*.bs"))
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            ok, fail = check_files(bs_files, pool.map(check_file, bs_files))
+    else:
+        ok, fail = check_files(bs_files, map(check_file, bs_files))
+    elapsed = time.perf_counter() - start
 
-passed = utils.bold(utils.green(f'{ok} PASSED'))
-failed = utils.bold(utils.red(f'{fail} FAILED'))
-print(f"{utils.bold('Summary:')} {passed}, {failed}")
-if fail > 0:
-    exit(fail)
+    passed = utils.bold(utils.green(f'{ok} PASSED'))
+    failed = utils.bold(utils.red(f'{fail} FAILED'))
+    print(f"{utils.bold('Summary:')} {passed}, {failed} in {elapsed:.2f} s")
+    if fail > 0:
+        exit(fail)
@@ -0,0 +1,130 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import os
+
+from harness import in_package, run_cases
+from bsc import Context
+from bsc.codegen.lua_ast import *
+from bsc.codegen.lua_render import LuaRender
+from bsc.utils import BSC_OUT_DIR
+
+def ident(name):
+    return LuaIdent(name)
+
+def num(value):
+    return LuaNumberLit(value)
+
+def binary(left, op, right):
+    return LuaBinaryExpr(left, op, right)
+
+def unary(op, right):
+    return LuaUnaryExpr(op, right)
+
+def assign(expr):
+    return LuaAssignment([ident("x")], [expr], False)
+
+def local_fn(name, args, stmts):
+    fn = LuaFunction([ident(arg) for arg in args])
+    for stmt in stmts:
+        fn.block.add_stmt(stmt)
+    return LuaAssignment([ident(name)], [fn])
+
+# each case is a list of statements and the code they must be rendered to
+# with `--minify`
+CASES = [
+    ([assign(binary(binary(ident("a"), "-", ident("b")), "-",
+                    ident("c")))], "x=a-b-c"),
+    ([assign(binary(ident("a"), "-", binary(ident("b"), "-",
+                                            ident("c"))))], "x=a-(b-c)"),
+    ([assign(binary(ident("a"), "*", binary(ident("b"), "+",
+                                            ident("c"))))], "x=a*(b+c)"),
+    ([assign(binary(binary(ident("a"), "and", ident("b")), "or",
+                    ident("c")))], "x=a and b or c"),
+    ([assign(binary(ident("a"), "..", binary(ident("b"), "..",
+                                             ident("c"))))], "x=a..b..c"),
+    ([assign(binary(binary(ident("a"), "..", ident("b")), "..",
+                    ident("c")))], "x=(a..b)..c"),
+    ([assign(binary(ident("a"), "^", binary(ident("b"), "^",
+                                            ident("c"))))], "x=a^b^c"),
+    ([assign(unary("-", binary(ident("a"), "^", num("2"))))], "x=-a^2"),
+    ([assign(binary(num("2"), "^", unary("-", ident("a"))))], "x=2^(-a)"),
+    ([assign(unary("not ", binary(ident("a"), "==",
+                                  ident("b"))))], "x=not(a==b)"),
+    ([assign(unary("not ", ident("a")))], "x=not a"),
+    # `--` would start a comment, `1..` is a malformed number and LuaJIT
+    # reads a sign after `0xE` as the sign of an exponent
+    ([assign(unary("-", unary("-", ident("a"))))], "x=- -a"),
+    ([assign(binary(ident("a"), "-", num("-1")))], "x=a- -1"),
+    ([assign(binary(num("1"), "..", ident("a")))], "x=1 ..a"),
+    ([assign(binary(num("0xE"), "-", ident("a")))], "x=0xE -a"),
+    ([assign(binary(num("1e5"), "-", ident("a")))], "x=1e5-a"),
+    ([
+        assign(
+            LuaCallExpr(
+                "upper", [], binary(ident("a"), "..", ident("b")),
+                is_method = True
+            )
+        )
+    ], "x=(a..b):upper()"),
+    # a statement that starts with `(` would be read as a call by the
+    # previous one
+    ([
+        LuaCallExpr("f"),
+        LuaCallExpr("g", [], binary(ident("a"), "or", ident("b")))
+    ], "f();(a or b).g()"),
+    ([
+        LuaComment("a comment"),
+        local_fn("f", ["a", "b"], [LuaReturn(ident("a"))]),
+        LuaBlock([assign(LuaTable([LuaTableField(ident("k"), num("1"))]))])
+    ], "local f=function(a,b)return a end do x={k=1}end"),
+]
+
+# the same cases, with `--minify-locals`
+LOCALS_CASES = [
+    ([
+        LuaAssignment([ident("value")], [ident("print")]),
+        local_fn(
+            "f", ["n"], [
+                LuaAssignment([ident("value")], [ident("value")]),
+                LuaReturn(
+                    LuaTable([LuaTableField(ident("value"), ident("n"))])
+                )
+            ]
+        ),
+        LuaCallExpr("f", [ident("value")])
+    ], "local a=print local b=function(c)local d=a return{value=c}end b(a)"),
+    ([
+        LuaAssignment([ident("t")], []),
+        LuaBlock([
+            LuaAssignment([ident("inner")], [num("1")]),
+            LuaAssignment([ident("t")], [ident("inner")], False)
+        ]),
+        LuaAssignment([ident("u")], [ident("t")])
+    ], "local a do local b=1 a=b end local b=a"),
+    # the locals never take the name of a global used by the module
+    ([LuaAssignment([ident("x")], [ident("a")])], "local b=a"),
+]
+
+ctx = Context(echo_diagnostics = False)
+
+def render(stmts, minify_locals):
+    ctx.prefs.is_minify = True
+    ctx.prefs.minify_locals = minify_locals
+    module = LuaModule("minified")
+    for stmt in stmts:
+        module.block.add_stmt(stmt)
+    LuaRender(ctx, [module]).render_modules()
+    with open(os.path.join(BSC_OUT_DIR, "minified.lua")) as f:
+        return f.read()
+
+def check_render(stmts, code, minify_locals):
+    if (output := render(stmts, minify_locals)) != code:
+        return [f"rendered as `{output}`"]
+    return []
+
+if __name__ == "__main__":
+    cases = [(code, (stmts, code, False)) for stmts, code in CASES]
+    cases += [(code, (stmts, code, True)) for stmts, code in LOCALS_CASES]
+    run_cases(cases, lambda case: in_package({}, lambda: check_render(*case)))
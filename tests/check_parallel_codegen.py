@@ -0,0 +1,54 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+import os, glob, tempfile
+
+from harness import run_cases
+from bsc import Context
+from bsc.utils import BSC_OUT_DIR
+
+JOBS = 4
+
+ctx = Context(echo_diagnostics = False)
+
+def compile_file(bs_file, jobs, out_dir):
+    # returns the generated files, by name; the output directory is relative
+    # to the working directory, so each compilation runs in its own one
+    old_cwd = os.getcwd()
+    os.chdir(out_dir)
+    try:
+        res = ctx.recompile(["-j", str(jobs), "--no-cache", bs_file])
+    finally:
+        os.chdir(old_cwd)
+    if not res.succeeded():
+        return None
+    outputs = {}
+    for lua_file in glob.glob(os.path.join(out_dir, BSC_OUT_DIR, "*.lua")):
+        with open(lua_file, "rb") as f:
+            outputs[os.path.basename(lua_file)] = f.read()
+    return outputs
+
+def check_file(bs_file):
+    with tempfile.TemporaryDirectory() as serial_dir, \
+        tempfile.TemporaryDirectory() as parallel_dir:
+        serial = compile_file(bs_file, 1, serial_dir)
+        parallel = compile_file(bs_file, JOBS, parallel_dir)
+    if serial == None or parallel == None:
+        return ["the file does not compile"]
+    errors = []
+    for name in sorted(serial.keys() | parallel.keys()):
+        if name not in parallel:
+            errors.append(f"`{name}` was not generated with `-j {JOBS}`")
+        elif name not in serial:
+            errors.append(f"`{name}` was only generated with `-j {JOBS}`")
+        elif serial[name] != parallel[name]:
+            errors.append(f"`{name}` is different with `-j {JOBS}`")
+    return errors
+
+if __name__ == "__main__":
+    # every package of `tests` and `examples` must generate the same files
+    # with the serial and the parallel code generation
+    bs_files = sorted(glob.glob("tests/*.bs") + glob.glob("examples/*.bs"))
+    run_cases([(bs_file, os.path.abspath(bs_file)) for bs_file in bs_files],
+              check_file)
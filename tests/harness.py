@@ -0,0 +1,55 @@
+# Copyright (C) 2024 Jose Mendoza. All rights reserved. Use of this
+# source code is governed by an MIT license that can be found in the
+# LICENSE file.
+
+# What the `check_*.py` scripts share: each one is a list of cases, and each
+# case a function that returns the list of its errors.
+
+import os, sys, tempfile
+
+BSC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bsc"
+)
+sys.path.append(os.path.dirname(BSC_DIR))
+
+from bsc import utils
+
+def write_file(name, src):
+    with open(os.path.join("src", name), "w") as f:
+        f.write(src)
+
+def in_package(files, check):
+    # runs `check` in a new directory, with `files` written to its `src`
+    # directory
+    old_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            os.mkdir("src")
+            for name, src in files.items():
+                write_file(name, src)
+            return check()
+        finally:
+            os.chdir(old_cwd)
+
+def run_cases(cases, run = lambda check: check()):
+    # runs each `(name, check)` case with `run` and exits with the number of
+    # cases that failed
+    ok, fail = 0, 0
+    for i, (name, check) in enumerate(cases):
+        print(f"  [{i+1}/{len(cases)}] {utils.bold(name)}", end = "")
+        errors = run(check)
+        if len(errors) == 0:
+            print(utils.bold(utils.green(" -> PASSED")))
+            ok += 1
+        else:
+            print(utils.bold(utils.red(" -> FAILED")))
+            for error in errors:
+                print(f"    {error}")
+            fail += 1
+
+    passed = utils.bold(utils.green(f'{ok} PASSED'))
+    failed = utils.bold(utils.red(f'{fail} FAILED'))
+    print(f"{utils.bold('Summary:')} {passed}, {failed}")
+    if fail > 0:
+        exit(fail)